@@ -0,0 +1,90 @@
+"""
+Startup-time benchmark for the MCP server.
+
+Imports `main` (which builds the FastMCP instance and registers every tool, but
+doesn't start serving) in fresh interpreters with `-X importtime`, and reports
+the wall-clock startup time plus the cumulative import time of the slowest modules.
+
+Usage:
+    python scripts/benchmark_startup.py [--runs 5] [--top 20] [--python /app/.venv/bin/python]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+
+def run_once(python: str) -> tuple[float, dict]:
+    """
+    Start one interpreter that imports the server module.
+
+    Args:
+        python: Path to the python executable to benchmark
+
+    Returns:
+        The wall-clock time in seconds and a dict of module name -> (self, cumulative) import time in microseconds
+    """
+    env = dict(os.environ)
+    # Replay mode doesn't need an API key, nothing is requested during startup anyway
+    env.setdefault("CR_API_MODE", "replay")
+
+    start = time.perf_counter()
+    completed = subprocess.run(
+        [python, "-X", "importtime", "-c", "import main"],
+        cwd=SRC_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    if completed.returncode != 0:
+        raise RuntimeError(f"Importing main failed:\n{completed.stderr}")
+
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+
+    return elapsed, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MCP server startup and per-module import time")
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh interpreters to start")
+    parser.add_argument("--top", type=int, default=20, help="Number of modules to report")
+    parser.add_argument("--python", default=sys.executable, help="Python executable to benchmark")
+    args = parser.parse_args()
+
+    wall_times = []
+    self_times = defaultdict(list)
+    cumulative_times = defaultdict(list)
+
+    for _ in range(args.runs):
+        elapsed, modules = run_once(args.python)
+        wall_times.append(elapsed)
+        for name, (self_us, cumulative_us) in modules.items():
+            self_times[name].append(self_us)
+            cumulative_times[name].append(cumulative_us)
+
+    print(f"Startup over {args.runs} runs: median {statistics.median(wall_times) * 1000:.1f} ms, "
+          f"min {min(wall_times) * 1000:.1f} ms, max {max(wall_times) * 1000:.1f} ms")
+    print()
+
+    ranked = sorted(cumulative_times, key=lambda name: statistics.median(cumulative_times[name]), reverse=True)
+
+    print(f"{'module':<50} {'self (ms)':>10} {'cumulative (ms)':>16}")
+    for name in ranked[:args.top]:
+        print(f"{name:<50} {statistics.median(self_times[name]) / 1000:>10.1f} "
+              f"{statistics.median(cumulative_times[name]) / 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
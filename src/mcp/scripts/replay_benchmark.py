@@ -0,0 +1,104 @@
+"""
+Load test of the API client against a recorded archive, no API key or network needed.
+
+Record an archive by running the server (or any workload) with CR_API_MODE=record, then replay every
+recorded endpoint through make_api_request, so the cache, single-flight locks, rate limiter, deadlines
+and hedging are all exercised, and report latency percentiles and throughput. The rate limiter still
+applies, raise CR_RATE_LIMIT_PER_SECOND to measure the client beyond the API's request budget.
+
+Usage:
+    python scripts/replay_benchmark.py [--archive data/api_archive.jsonl.gz] [--iterations 10] [--concurrency 8] [--timing] [--speed 1] [--no-cache]
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+
+def read_endpoints(path: str) -> list[str]:
+    """
+    Get the recorded endpoints of an archive, in recording order.
+
+    Args:
+        path: Path of the archive
+
+    Returns:
+        The endpoint of every recorded response
+    """
+    endpoints = []
+    with gzip.open(path, "rt", encoding="utf-8") as archive:
+        try:
+            for line in archive:
+                endpoints.append(json.loads(line)["endpoint"])
+        except (EOFError, json.JSONDecodeError):
+            pass
+    return endpoints
+
+
+def percentile(sorted_values: list[float], percent: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * percent / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded archive through the API client")
+    parser.add_argument("--archive", help="Archive to replay, defaults to CR_ARCHIVE_PATH")
+    parser.add_argument("--iterations", type=int, default=10, help="Times to replay the whole archive")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent callers")
+    parser.add_argument("--timing", action="store_true", help="Emulate the recorded upstream latency")
+    parser.add_argument("--speed", type=float, default=1.0, help="Divide emulated latency by this factor")
+    parser.add_argument("--no-cache", action="store_true", help="Send every call upstream instead of serving repeats from cache")
+    args = parser.parse_args()
+
+    # Set before tools is imported, utils.py reads its configuration at import
+    os.environ["CR_API_MODE"] = "replay"
+    os.environ["CR_REPLAY_TIMING"] = "true" if args.timing else "false"
+    os.environ["CR_REPLAY_SPEED"] = str(args.speed)
+    # The benchmark measures this process, keep it off a shared backend a .env file may configure
+    os.environ.setdefault("CR_STATE_BACKEND", "memory")
+    if args.archive:
+        os.environ["CR_ARCHIVE_PATH"] = args.archive
+    if args.no_cache:
+        os.environ["CR_CACHE_TTL_SECONDS"] = "0"
+        os.environ["CR_STALE_TTL_SECONDS"] = "0"
+
+    # Failed calls are counted in the report, recorded error responses would flood the output otherwise
+    logging.basicConfig(level=logging.CRITICAL)
+
+    from tools import metrics, utils
+
+    endpoints = read_endpoints(utils.CR_ARCHIVE_PATH) * args.iterations
+    if not endpoints:
+        sys.exit(f"No recorded responses in {utils.CR_ARCHIVE_PATH}")
+
+    def call(endpoint: str) -> tuple[float, bool]:
+        start = time.perf_counter()
+        try:
+            utils.make_api_request(endpoint)
+            ok = True
+        except Exception:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(call, endpoints))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, ok in results if not ok)
+
+    print(f"{len(results)} calls in {elapsed:.2f}s ({len(results) / elapsed:.1f} calls/s), {errors} errors")
+    print(f"latency ms: p50 {percentile(latencies, 50) * 1000:.2f}, p95 {percentile(latencies, 95) * 1000:.2f}, "
+          f"p99 {percentile(latencies, 99) * 1000:.2f}, mean {statistics.mean(latencies) * 1000:.2f}")
+    print(f"counters: {metrics.snapshot()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""
+Batch job that samples battle logs of top Path of Legends players and aggregates card and deck
+usage/win rates into the meta stats store queried by the get_card_meta_stats and get_top_decks tools.
+Runs are incremental, battles already in the store are skipped.
+
+Usage:
+    python scripts/sample_meta.py --season 2025-06 --location 57000249 [--players 200] [--rate 2]
+"""
+import argparse
+import logging
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from tools.meta_store import MetaStore, CR_META_STORE_PATH, CR_META_SAMPLE_REQUESTS_PER_SECOND, sample_top_players
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sample top player battle logs into the meta stats store")
+    parser.add_argument("--season", action="append", default=[], help="Season id for global Path of Legends rankings (repeatable)")
+    parser.add_argument("--location", action="append", default=[], type=int, help="Location id for Path of Legends rankings (repeatable)")
+    parser.add_argument("--players", type=int, default=200, help="Top players to sample per ranking")
+    parser.add_argument("--rate", type=float, default=CR_META_SAMPLE_REQUESTS_PER_SECOND, help="Upstream requests per second")
+    parser.add_argument("--store", default=CR_META_STORE_PATH, help="Path of the meta stats store")
+    args = parser.parse_args()
+
+    if not args.season and not args.location:
+        parser.error("At least one --season or --location is required")
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    store = MetaStore.load(args.store, seen_battles=True)
+    sample_top_players(
+        store,
+        season_ids=args.season,
+        location_ids=args.location,
+        players_per_ranking=args.players,
+        requests_per_second=args.rate,
+    )
+
+
+if __name__ == "__main__":
+    main()
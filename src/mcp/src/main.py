@@ -1,11 +1,26 @@
+import logging
+
 from mcp.server import FastMCP
+from starlette.requests import Request
+from starlette.responses import JSONResponse
 
 from tools import (
     register_players_tools,
     register_clans_tools, 
     register_cards_tools,
-    register_ranking_tools
+    register_ranking_tools,
+    register_watchlist_tools,
+    register_meta_tools,
+    register_result_tools,
+    register_query_tools
     )
+from tools.metrics import snapshot
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
 
 mcp = FastMCP(
     name="Clash Royale MCP Server",
@@ -13,12 +28,24 @@ mcp = FastMCP(
     port=8000,
 )
 
-# Register all tools
-register_players_tools(mcp)
-register_clans_tools(mcp)
-register_cards_tools(mcp)
-register_ranking_tools(mcp)
+# Register all tools, the Clash Royale data tools can also be chained with run_query
+data_tools = [
+    *register_players_tools(mcp),
+    *register_clans_tools(mcp),
+    *register_cards_tools(mcp),
+    *register_ranking_tools(mcp),
+    *register_watchlist_tools(mcp),
+    *register_meta_tools(mcp),
+]
+register_result_tools(mcp)
+register_query_tools(mcp, data_tools)
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> JSONResponse:
+    """Request counters: upstream requests and timeouts, cache hits, hedges fired/won, deadlines exceeded, stale responses served, state backend errors."""
+    return JSONResponse(snapshot())
 
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
\ No newline at end of file
+    mcp.run(transport="streamable-http")
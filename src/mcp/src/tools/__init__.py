@@ -1,16 +1,33 @@
 # Tools package initialization file
+import os
+
+from dotenv import load_dotenv
+
+# Loaded here, before any submodule is imported, since several of them read their CR_* settings
+# at import. Values already in the environment (e.g. from a container's env_file) take precedence
+dotenvPath = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
+load_dotenv(dotenvPath, override=False)
+
 from .utils import make_api_request, encode_tag, build_query_string
 from .players import register_players_tools
 from .clans import register_clans_tools
 from .cards import register_cards_tools
 from .rankings import register_ranking_tools
+from .watchlist import register_watchlist_tools
+from .meta import register_meta_tools
+from .results import register_result_tools
+from .query import register_query_tools
 
 __all__ = [
     "register_players_tools",
-    "register_clans_tools", 
+    "register_clans_tools",
     "register_cards_tools",
     "register_ranking_tools",
-    "make_api_request", 
+    "register_watchlist_tools",
+    "register_meta_tools",
+    "register_result_tools",
+    "register_query_tools",
+    "make_api_request",
     "encode_tag",
     "build_query_string"
-    ]
\ No newline at end of file
+    ]
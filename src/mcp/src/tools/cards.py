@@ -1,5 +1,7 @@
 import logging
 from .utils import make_api_request, build_query_string
+from .deadline import with_deadline
+from .results import guard_result_size
 
 logger = logging.getLogger(__name__)
 
@@ -9,9 +11,14 @@ def register_cards_tools(mcp):
     
     Args:
         mcp: The FastMCP server instance
+
+    Returns:
+        The registered tool functions
     """
     
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_cards(
         limit: int = None
     ) -> dict:
@@ -19,7 +26,8 @@ def register_cards_tools(mcp):
         Get a list of available cards from the Clash Royale API. This tool ONLY gets info about the cards in the game, not the card's 
         game stats such as win rates, usage rates, or any other stats. It only returns the card's basic information such as name, id, elixir cost, rarity, etc.
 
-        Use this tool if the user wants to see the available cards in the game, or wants to get information about specific card(s). Do NOT use this tool to get game stats or any other detailed information about the card's performance in game.
+        Use this tool if the user wants to see the available cards in the game, or wants to get information about specific card(s). Do NOT use this tool to get game stats or any other detailed information about the card's performance in game,
+        use the get_card_meta_stats and get_top_decks tools for win rates and usage rates instead.
         
         If the card has an evolutionMedium and has a maxEvolutionLevel, then it has an evolution. If it does not, then it does not have an evolution.
 
@@ -46,4 +54,6 @@ def register_cards_tools(mcp):
 
         result = make_api_request(endpoint)
         logger.info(f"get_cards completed successfully. Retrieved {len(result)} cards")
-        return result
\ No newline at end of file
+        return result
+
+    return [get_cards]
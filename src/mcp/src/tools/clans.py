@@ -1,5 +1,7 @@
 import logging
 from .utils import make_api_request, encode_tag, build_query_string
+from .deadline import with_deadline
+from .results import guard_result_size
 
 logger = logging.getLogger(__name__)
 
@@ -9,9 +11,14 @@ def register_clans_tools(mcp):
     
     Args:
         mcp: The FastMCP server instance
+
+    Returns:
+        The registered tool functions
     """
 
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def search_clans(
         name: str = None,
         location_id: int = None,
@@ -68,6 +75,8 @@ def register_clans_tools(mcp):
 
 
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_clan_info(clan_tag: str) -> dict:
         """
         Fetch detailed information about a specific clan from the Clash Royale API. This should either be provided by the user in the
@@ -89,6 +98,8 @@ def register_clans_tools(mcp):
         return result
 
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_clan_members(
         clan_tag: str,
         limit: int = None,
@@ -189,4 +200,6 @@ def register_clans_tools(mcp):
         
     #     result = make_api_request(endpoint)
     #     logger.info(f"get_clan_current_river_race completed successfully")
-    #     return result
\ No newline at end of file
+    #     return result
+
+    return [search_clans, get_clan_info, get_clan_members]
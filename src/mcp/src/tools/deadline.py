@@ -0,0 +1,94 @@
+import os
+import time
+import inspect
+import logging
+import functools
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Total time a tool call may spend, including waiting on the rate limiter and every upstream request it makes
+CR_TOOL_TIMEOUT_SECONDS = float(os.getenv("CR_TOOL_TIMEOUT_SECONDS", "10"))
+
+# Tools whose upstream calls are slower than usual (large pages, wildcard search) get a larger budget.
+# Overridable with CR_TOOL_TIMEOUTS, e.g. "search_clans=20,get_cards=5"
+TOOL_TIMEOUTS = {
+    "search_clans": 15,
+    "get_location_path_of_legends_player_rankings": 15,
+    "get_top_path_of_legends_players_rankings": 15,
+    "get_location_clan_rankings": 15,
+    "get_location_clan_war_rankings": 15,
+    # Runs several tool calls, this is the budget for all of them together
+    "run_query": 30,
+}
+for override in filter(None, os.getenv("CR_TOOL_TIMEOUTS", "").split(",")):
+    tool_name, seconds = override.split("=")
+    TOOL_TIMEOUTS[tool_name.strip()] = float(seconds)
+
+_deadline = ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The time budget of the current tool call ran out."""
+
+
+def remaining() -> float | None:
+    """
+    Seconds left before the current deadline.
+
+    Returns:
+        The remaining seconds (0 once the deadline has passed), or None outside of a deadline
+    """
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0.0, deadline - time.monotonic())
+
+
+def check() -> None:
+    """
+    Raise DeadlineExceeded if the current deadline has passed.
+    """
+    if remaining() == 0:
+        raise DeadlineExceeded("The request took too long and was cancelled.")
+
+
+def _enter(budget: float):
+    deadline = time.monotonic() + budget
+    outer = _deadline.get()
+    return _deadline.set(deadline if outer is None else min(outer, deadline))
+
+
+def with_deadline(seconds: float = None):
+    """
+    Decorator giving a tool a total time budget. Upstream calls made while the tool runs are cut off
+    when the budget runs out. When tools are nested the earlier deadline wins.
+
+    Args:
+        seconds: The budget, defaults to the tool's entry in TOOL_TIMEOUTS or CR_TOOL_TIMEOUT_SECONDS
+    """
+    def decorator(fn):
+        budget = seconds or TOOL_TIMEOUTS.get(fn.__name__, CR_TOOL_TIMEOUT_SECONDS)
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                token = _enter(budget)
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    _deadline.reset(token)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _enter(budget)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _deadline.reset(token)
+
+        return wrapper
+
+    return decorator
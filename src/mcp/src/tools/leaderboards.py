@@ -1,5 +1,7 @@
 import logging
 from .utils import make_api_request, build_query_string
+from .deadline import with_deadline
+from .results import guard_result_size
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +15,8 @@ def register_leaderboards_tools(mcp):
     """
     
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_specific_leaderboard(
         leaderboard_id: int,
         limit: int = None,
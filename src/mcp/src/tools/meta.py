@@ -0,0 +1,114 @@
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_store = None
+_store_mtime = None
+_store_lock = threading.Lock()
+
+
+def get_meta_store():
+    """
+    Get the meta statistics store, reloading it whenever the sampler has written a new version.
+
+    Returns:
+        The current MetaStore
+    """
+    global _store, _store_mtime
+
+    # Imported here so numpy stays off the server's startup path until meta stats are queried
+    from .meta_store import MetaStore, CR_META_STORE_PATH
+
+    with _store_lock:
+        mtime = os.path.getmtime(CR_META_STORE_PATH) if os.path.exists(CR_META_STORE_PATH) else None
+        if _store is None or mtime != _store_mtime:
+            _store = MetaStore.load(CR_META_STORE_PATH)
+            _store_mtime = mtime
+            logger.info(f"Loaded meta stats store with {_store.total_decks // 2} battles")
+        return _store
+
+
+def register_meta_tools(mcp):
+    """
+    Register all meta statistics tools with the MCP server.
+
+    Args:
+        mcp: The FastMCP server instance
+
+    Returns:
+        The registered tool functions
+    """
+
+    @mcp.tool()
+    def get_card_meta_stats(
+        card_names: list[str] = None,
+        sort_by: str = "usage",
+        min_uses: int = 0,
+        limit: int = 20,
+        ) -> dict:
+        """
+        Get card usage rates and win rates, computed from battles of top Path of Legends players that are sampled periodically.
+        Use this tool when the user asks how popular or how strong a card is, what the meta is, or which cards are the best.
+
+        Args:
+            card_names: Only return stats for these cards, by exact card name (e.g. ["Hog Rider", "The Log"]). (optional)
+
+            sort_by: Either "usage" or "win_rate". Defaults to "usage".
+
+            min_uses: Skip cards played fewer times than this, use it to avoid win rates from tiny samples. (optional)
+
+            limit: Limit the number of cards returned. Defaults to 20.
+
+        Returns:
+            The number of sampled battles, when the sample was last updated, and per card its usage rate (share of decks
+            containing the card), win rate, number of uses and wins.
+        """
+        logger.info(f"get_card_meta_stats called with card_names={card_names}, sort_by={sort_by}, min_uses={min_uses}, limit={limit}")
+
+        store = get_meta_store()
+        result = {
+            "sampledBattles": store.total_decks // 2,
+            "updatedAt": store.updated_at,
+            "cards": store.card_stats(card_names, sort_by, min_uses, limit),
+        }
+        logger.info(f"get_card_meta_stats completed successfully. Found {len(result['cards'])} cards")
+        return result
+
+    @mcp.tool()
+    def get_top_decks(
+        include_cards: list[str] = None,
+        sort_by: str = "win_rate",
+        min_uses: int = 20,
+        limit: int = 10,
+        ) -> dict:
+        """
+        Get the best or most used decks, computed from battles of top Path of Legends players that are sampled periodically.
+        Use this tool when the user asks for deck recommendations, the best decks, or decks built around specific cards.
+
+        Args:
+            include_cards: Only return decks containing all of these cards, by exact card name (e.g. ["Hog Rider"]). (optional)
+
+            sort_by: Either "win_rate" or "usage". Defaults to "win_rate".
+
+            min_uses: Skip decks played fewer times than this. Defaults to 20, lower it if no decks are returned.
+
+            limit: Limit the number of decks returned. Defaults to 10.
+
+        Returns:
+            The number of sampled battles, when the sample was last updated, and per deck its 8 cards, usage rate,
+            win rate, number of uses and wins.
+        """
+        logger.info(f"get_top_decks called with include_cards={include_cards}, sort_by={sort_by}, min_uses={min_uses}, limit={limit}")
+
+        store = get_meta_store()
+        result = {
+            "sampledBattles": store.total_decks // 2,
+            "updatedAt": store.updated_at,
+            "decks": store.deck_stats(include_cards, sort_by, min_uses, limit),
+        }
+        logger.info(f"get_top_decks completed successfully. Found {len(result['decks'])} decks")
+        return result
+
+    return [get_card_meta_stats, get_top_decks]
@@ -0,0 +1,446 @@
+import os
+import time
+import hashlib
+import logging
+import numpy as np
+from .utils import make_api_request, encode_tag, build_query_string
+
+logger = logging.getLogger(__name__)
+
+CR_META_STORE_PATH = os.getenv(
+    "CR_META_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'meta_stats.npz'),
+)
+# Upstream requests per second the sampler may spend
+CR_META_SAMPLE_REQUESTS_PER_SECOND = float(os.getenv("CR_META_SAMPLE_REQUESTS_PER_SECOND", "2"))
+# Battle keys remembered for deduplication, oldest are forgotten first
+CR_META_MAX_SEEN_BATTLES = int(os.getenv("CR_META_MAX_SEEN_BATTLES", "2000000"))
+
+# Only 1v1 battles with full decks are aggregated
+BATTLE_TYPES = ("pathOfLegend", "PvP")
+DECK_SIZE = 8
+
+_FNV_OFFSET = np.uint64(0xCBF29CE484222325)
+_FNV_PRIME = np.uint64(0x100000001B3)
+
+
+def _hash_rows(rows: np.ndarray) -> np.ndarray:
+    """
+    FNV-1a style 64-bit hash of each row of an integer matrix.
+    """
+    hashes = np.full(rows.shape[0], _FNV_OFFSET, dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        for column in rows.astype(np.uint64).T:
+            hashes = (hashes ^ column) * _FNV_PRIME
+    return hashes
+
+
+def _merge_counts(keys: np.ndarray, counts: list, new_keys: np.ndarray, new_counts: list):
+    """
+    Add per-key counts into a sorted key table, growing it with any keys it doesn't have yet.
+    Both key arrays must be sorted and unique.
+
+    Returns:
+        The merged keys, the merged count arrays in the same order as `counts`, and for each
+        old key its index in the merged table
+    """
+    merged_keys = np.union1d(keys, new_keys)
+    old_positions = np.searchsorted(merged_keys, keys)
+    new_positions = np.searchsorted(merged_keys, new_keys)
+
+    merged_counts = []
+    for old, new in zip(counts, new_counts):
+        merged = np.zeros(len(merged_keys), dtype=np.int64)
+        merged[old_positions] = old
+        merged[new_positions] += new
+        merged_counts.append(merged)
+
+    return merged_keys, merged_counts, old_positions
+
+
+class MetaStore:
+    """
+    Card and deck usage/win counts aggregated from sampled battles, kept as numpy arrays and saved
+    as a single compressed .npz file.
+
+    Usage is counted per deck played, so a battle adds one use for each side and one win for the winner.
+    """
+
+    def __init__(self, path: str = CR_META_STORE_PATH):
+        self.path = path
+        self.total_decks = 0
+        self.card_ids = np.zeros(0, dtype=np.int64)
+        self.card_names = np.zeros(0, dtype="<U64")
+        self.card_uses = np.zeros(0, dtype=np.int64)
+        self.card_wins = np.zeros(0, dtype=np.int64)
+        self.deck_keys = np.zeros(0, dtype=np.uint64)
+        self.deck_cards = np.zeros((0, DECK_SIZE), dtype=np.int64)
+        self.deck_uses = np.zeros(0, dtype=np.int64)
+        self.deck_wins = np.zeros(0, dtype=np.int64)
+        # Sorted battle keys for deduplication, and the order each was added in, so the oldest are forgotten first
+        self.seen_battles = np.zeros(0, dtype=np.uint64)
+        self.seen_order = np.zeros(0, dtype=np.int64)
+        self.updated_at = None
+
+    @classmethod
+    def load(cls, path: str = CR_META_STORE_PATH, seen_battles: bool = False) -> "MetaStore":
+        """
+        Load a store from disk, or create an empty one if the file doesn't exist yet.
+
+        Args:
+            path: Path of the .npz file
+            seen_battles: Also load the battle keys used for deduplication, needed to add battles and
+                save. Stores that are only queried leave them on disk
+
+        Returns:
+            The loaded store
+        """
+        store = cls(path)
+        if not os.path.exists(path):
+            return store
+
+        # Arrays in an .npz are only read when accessed
+        with np.load(path) as data:
+            store.total_decks = int(data["total_decks"])
+            store.updated_at = str(data["updated_at"]) or None
+            for name in ("card_ids", "card_names", "card_uses", "card_wins", "deck_keys",
+                         "deck_cards", "deck_uses", "deck_wins"):
+                setattr(store, name, data[name])
+
+            if not seen_battles:
+                store.seen_battles = store.seen_order = None
+            elif "seen_order" in data:
+                store.seen_battles, store.seen_order = data["seen_battles"], data["seen_order"]
+            else:
+                # Stores written before the keys were kept sorted hold them in the order they were added
+                keys = data["seen_battles"]
+                order = np.argsort(keys, kind="stable")
+                store.seen_battles, store.seen_order = keys[order], order.astype(np.int64)
+        return store
+
+    def _require_seen_battles(self):
+        if self.seen_battles is None:
+            raise ValueError("This store was loaded without its seen battles, load it with seen_battles=True to add battles or save it.")
+
+    def save(self) -> None:
+        """
+        Write the store to disk, replacing the previous file atomically so readers never see a partial write.
+        """
+        self._require_seen_battles()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self.updated_at = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+
+        tmp_path = f"{self.path}.tmp.npz"
+        np.savez_compressed(
+            tmp_path,
+            total_decks=self.total_decks,
+            updated_at=self.updated_at,
+            card_ids=self.card_ids,
+            card_names=self.card_names,
+            card_uses=self.card_uses,
+            card_wins=self.card_wins,
+            deck_keys=self.deck_keys,
+            deck_cards=self.deck_cards,
+            deck_uses=self.deck_uses,
+            deck_wins=self.deck_wins,
+            seen_battles=self.seen_battles,
+            seen_order=self.seen_order,
+        )
+        os.replace(tmp_path, self.path)
+
+    def add_battles(self, battles: list) -> int:
+        """
+        Aggregate battles into the store, skipping battles that were already added (the same battle
+        shows up in both players' battle logs).
+
+        Args:
+            battles: Battle log entries as returned by the API
+
+        Returns:
+            The number of battles added
+        """
+        self._require_seen_battles()
+        keys, decks, wins = [], [], []
+        for battle in battles:
+            if battle.get("type") not in BATTLE_TYPES:
+                continue
+            team, opponent = battle.get("team", []), battle.get("opponent", [])
+            if len(team) != 1 or len(opponent) != 1:
+                continue
+            team, opponent = team[0], opponent[0]
+            if len(team.get("cards", [])) != DECK_SIZE or len(opponent.get("cards", [])) != DECK_SIZE:
+                continue
+
+            # Same key regardless of whose battle log the battle came from
+            players = "|".join(sorted((team.get("tag", ""), opponent.get("tag", ""))))
+            keys.append(hash_battle(battle.get("battleTime", ""), players))
+
+            decks.append([card["id"] for card in team["cards"]])
+            decks.append([card["id"] for card in opponent["cards"]])
+            team_crowns, opponent_crowns = team.get("crowns", 0), opponent.get("crowns", 0)
+            wins.append(team_crowns > opponent_crowns)
+            wins.append(opponent_crowns > team_crowns)
+
+        if not keys:
+            return 0
+
+        keys = np.array(keys, dtype=np.uint64)
+        decks = np.sort(np.array(decks, dtype=np.int64), axis=1)
+        wins = np.array(wins, dtype=np.int64)
+
+        # Drop battles already in the store and duplicates within this batch, each battle owns two deck rows
+        _, first = np.unique(keys, return_index=True)
+        fresh = np.zeros(len(keys), dtype=bool)
+        fresh[first] = True
+        fresh &= ~_contains(self.seen_battles, keys)
+        if not fresh.any():
+            return 0
+        rows = np.repeat(fresh, 2)
+        keys, decks, wins = keys[fresh], decks[rows], wins[rows]
+
+        # Decks, deduplicated by a hash of their sorted card ids
+        deck_keys = _hash_rows(decks)
+        unique_decks, first, inverse = np.unique(deck_keys, return_index=True, return_inverse=True)
+        self.deck_keys, (self.deck_uses, self.deck_wins), old_positions = _merge_counts(
+            self.deck_keys,
+            [self.deck_uses, self.deck_wins],
+            unique_decks,
+            [np.bincount(inverse, minlength=len(unique_decks)), np.bincount(inverse, weights=wins, minlength=len(unique_decks)).astype(np.int64)],
+        )
+        deck_cards = np.zeros((len(self.deck_keys), DECK_SIZE), dtype=np.int64)
+        deck_cards[old_positions] = self.deck_cards
+        deck_cards[np.searchsorted(self.deck_keys, unique_decks)] = decks[first]
+        self.deck_cards = deck_cards
+
+        # Cards, every card in a deck row gets that row's use and win
+        card_ids = decks.ravel()
+        card_wins = np.repeat(wins, DECK_SIZE)
+        unique_cards, inverse = np.unique(card_ids, return_inverse=True)
+        self.card_ids, (self.card_uses, self.card_wins), old_positions = _merge_counts(
+            self.card_ids,
+            [self.card_uses, self.card_wins],
+            unique_cards,
+            [np.bincount(inverse, minlength=len(unique_cards)), np.bincount(inverse, weights=card_wins, minlength=len(unique_cards)).astype(np.int64)],
+        )
+        card_names = np.zeros(len(self.card_ids), dtype="<U64")
+        card_names[old_positions] = self.card_names
+        unnamed = set(self.card_ids[card_names == ""].tolist())
+        if unnamed:
+            # Names are only looked up for cards the store hasn't seen before, which is rarely any
+            names = _card_names(battles, unnamed)
+            card_names[np.searchsorted(self.card_ids, list(names))] = list(names.values())
+        self.card_names = card_names
+
+        self.total_decks += len(wins)
+        self._remember(keys)
+        return len(keys)
+
+    def _remember(self, keys: np.ndarray) -> None:
+        """
+        Merge new battle keys into the sorted seen keys, forgetting the oldest past CR_META_MAX_SEEN_BATTLES.
+        """
+        next_order = int(self.seen_order.max()) + 1 if len(self.seen_order) else 0
+        order = np.argsort(keys)
+        keys = keys[order]
+        added_order = next_order + order.astype(np.int64)
+
+        positions = np.searchsorted(self.seen_battles, keys)
+        seen_battles = np.insert(self.seen_battles, positions, keys)
+        seen_order = np.insert(self.seen_order, positions, added_order)
+
+        if len(seen_battles) > CR_META_MAX_SEEN_BATTLES:
+            # Orders are consecutive, so everything below this one is older than the kept keys
+            keep = seen_order >= next_order + len(keys) - CR_META_MAX_SEEN_BATTLES
+            seen_battles, seen_order = seen_battles[keep], seen_order[keep]
+        self.seen_battles, self.seen_order = seen_battles, seen_order
+
+    def card_ids_for_names(self, card_names: list[str]) -> np.ndarray:
+        """
+        Look up card ids by card name, case-insensitively.
+
+        Args:
+            card_names: The card names to look up
+
+        Returns:
+            The matching card ids
+        """
+        lowered = np.char.lower(self.card_names)
+        wanted = [name.lower() for name in card_names]
+        missing = [name for name in card_names if name.lower() not in lowered]
+        if missing:
+            raise ValueError(f"Unknown card name(s): {', '.join(missing)}. Use the get_cards tool to check card names.")
+        return self.card_ids[np.isin(lowered, wanted)]
+
+    def card_stats(self, card_names: list[str] = None, sort_by: str = "usage", min_uses: int = 0, limit: int = 20) -> list[dict]:
+        """
+        Usage and win rates per card.
+
+        Args:
+            card_names: Only return these cards (optional)
+            sort_by: "usage" or "win_rate"
+            min_uses: Skip cards played fewer times than this
+            limit: Maximum number of cards to return
+
+        Returns:
+            One dict per card, sorted descending by `sort_by`
+        """
+        mask = self.card_uses >= max(min_uses, 1)
+        if card_names:
+            mask &= np.isin(self.card_ids, self.card_ids_for_names(card_names))
+
+        usage_rates = self.card_uses / max(self.total_decks, 1)
+        win_rates = np.divide(self.card_wins, self.card_uses, out=np.zeros(len(self.card_uses)), where=self.card_uses > 0)
+
+        indices = np.flatnonzero(mask)
+        order = _sort_order(indices, usage_rates, win_rates, sort_by)[:limit]
+        return [
+            {
+                "name": str(self.card_names[i]),
+                "id": int(self.card_ids[i]),
+                "usageRate": round(float(usage_rates[i]), 4),
+                "winRate": round(float(win_rates[i]), 4),
+                "uses": int(self.card_uses[i]),
+                "wins": int(self.card_wins[i]),
+            }
+            for i in order
+        ]
+
+    def deck_stats(self, include_cards: list[str] = None, sort_by: str = "win_rate", min_uses: int = 20, limit: int = 10) -> list[dict]:
+        """
+        Usage and win rates per deck.
+
+        Args:
+            include_cards: Only return decks containing all of these cards (optional)
+            sort_by: "usage" or "win_rate"
+            min_uses: Skip decks played fewer times than this
+            limit: Maximum number of decks to return
+
+        Returns:
+            One dict per deck, sorted descending by `sort_by`
+        """
+        mask = self.deck_uses >= max(min_uses, 1)
+        if include_cards:
+            for card_id in self.card_ids_for_names(include_cards):
+                mask &= (self.deck_cards == card_id).any(axis=1)
+
+        usage_rates = self.deck_uses / max(self.total_decks, 1)
+        win_rates = np.divide(self.deck_wins, self.deck_uses, out=np.zeros(len(self.deck_uses)), where=self.deck_uses > 0)
+
+        indices = np.flatnonzero(mask)
+        order = _sort_order(indices, usage_rates, win_rates, sort_by)[:limit]
+        names_by_id = dict(zip(self.card_ids.tolist(), self.card_names.tolist()))
+        return [
+            {
+                "cards": [names_by_id.get(card_id, str(card_id)) for card_id in self.deck_cards[i].tolist()],
+                "usageRate": round(float(usage_rates[i]), 6),
+                "winRate": round(float(win_rates[i]), 4),
+                "uses": int(self.deck_uses[i]),
+                "wins": int(self.deck_wins[i]),
+            }
+            for i in order
+        ]
+
+
+def _contains(sorted_keys: np.ndarray, keys: np.ndarray) -> np.ndarray:
+    """
+    Which of `keys` are in `sorted_keys`, with a binary search instead of the sort np.isin does.
+    """
+    if not len(sorted_keys):
+        return np.zeros(len(keys), dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), len(sorted_keys) - 1)
+    return sorted_keys[positions] == keys
+
+
+def _card_names(battles: list, card_ids: set) -> dict:
+    """
+    Find the names of the given card ids in a list of battles.
+    """
+    names = {}
+    for battle in battles:
+        for side in battle.get("team", []) + battle.get("opponent", []):
+            for card in side.get("cards", []):
+                if card.get("id") in card_ids and card["id"] not in names:
+                    names[card["id"]] = card.get("name", "")
+        if len(names) == len(card_ids):
+            break
+    return names
+
+
+def _sort_order(indices: np.ndarray, usage_rates: np.ndarray, win_rates: np.ndarray, sort_by: str) -> np.ndarray:
+    if sort_by == "usage":
+        primary, secondary = usage_rates, win_rates
+    elif sort_by == "win_rate":
+        primary, secondary = win_rates, usage_rates
+    else:
+        raise ValueError("sort_by must be either 'usage' or 'win_rate'.")
+    # lexsort sorts by the last key first, negated for descending order
+    return indices[np.lexsort((-secondary[indices], -primary[indices]))]
+
+
+def hash_battle(battle_time: str, players: str) -> int:
+    """
+    Stable 64-bit key for a battle, used to deduplicate battles across battle logs and runs.
+    """
+    return int.from_bytes(hashlib.blake2b(f"{battle_time}|{players}".encode(), digest_size=8).digest(), "little")
+
+
+def sample_top_players(
+    store: MetaStore,
+    season_ids: list[str] = (),
+    location_ids: list[int] = (),
+    players_per_ranking: int = 200,
+    requests_per_second: float = CR_META_SAMPLE_REQUESTS_PER_SECOND,
+    save_every: int = 50,
+) -> int:
+    """
+    Sample battle logs of top Path of Legends players into the store.
+
+    Args:
+        store: The store to aggregate into, saved periodically and at the end
+        season_ids: Seasons to take global Path of Legends rankings from
+        location_ids: Locations to take Path of Legends rankings from
+        players_per_ranking: Number of top players to take from each ranking
+        requests_per_second: Upstream request budget for the whole run
+        save_every: Save the store after this many battle logs
+
+    Returns:
+        The number of battles added
+    """
+    interval = 1 / requests_per_second
+    last_request = 0.0
+
+    def request(endpoint: str):
+        nonlocal last_request
+        delay = last_request + interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        last_request = time.monotonic()
+        return make_api_request(endpoint)
+
+    limit = build_query_string({"limit": players_per_ranking})
+    ranking_endpoints = [f"locations/global/pathoflegend/{encode_tag(season_id)}/rankings/players?{limit}" for season_id in season_ids]
+    ranking_endpoints += [f"locations/{location_id}/pathoflegend/players?{limit}" for location_id in location_ids]
+
+    player_tags = []
+    for endpoint in ranking_endpoints:
+        for player in request(endpoint).get("items", []):
+            if player.get("tag") not in player_tags:
+                player_tags.append(player["tag"])
+    logger.info(f"Sampling battle logs of {len(player_tags)} players")
+
+    added = 0
+    for count, player_tag in enumerate(player_tags, start=1):
+        try:
+            battle_log = request(f"players/{encode_tag(player_tag)}/battlelog")
+        except Exception as e:
+            logger.error(f"Skipping {player_tag}: {e}")
+            continue
+
+        added += store.add_battles(battle_log)
+        if count % save_every == 0:
+            store.save()
+            logger.info(f"Sampled {count}/{len(player_tags)} players, {added} new battles")
+
+    store.save()
+    logger.info(f"Sampling finished, {added} new battles, {store.total_decks // 2} battles in store")
+    return added
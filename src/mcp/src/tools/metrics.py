@@ -0,0 +1,27 @@
+import threading
+
+_lock = threading.Lock()
+_counters = {}
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """
+    Increment a counter, creating it at zero if it doesn't exist yet.
+
+    Args:
+        name: The counter name
+        amount: How much to add
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def snapshot() -> dict:
+    """
+    Get the current value of every counter.
+
+    Returns:
+        A dict of counter name -> value
+    """
+    with _lock:
+        return dict(_counters)
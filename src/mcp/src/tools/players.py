@@ -1,5 +1,8 @@
 import logging
 from .utils import make_api_request, encode_tag
+from .deadline import with_deadline
+from .results import guard_result_size
+from .watchlist import get_watchlist
 
 logger = logging.getLogger(__name__)
 
@@ -9,9 +12,14 @@ def register_players_tools(mcp):
     
     Args:
         mcp: The FastMCP server instance
+
+    Returns:
+        The registered tool functions
     """
     
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_player_info(player_tag: str) -> dict:
         """
         Fetch player info from the Clash Royale API. A player tag must be provided to look up a player.
@@ -52,6 +60,12 @@ def register_players_tools(mcp):
         """
         logger.info(f"get_player_info called with player_tag: {player_tag}")
         
+        # Watched players are answered from the watchlist's last poll, while it is recent
+        watched = get_watchlist().get_fresh(player_tag)
+        if watched is not None:
+            logger.info(f"get_player_info served from watchlist for player: {watched.info.get('name', 'Unknown')}")
+            return watched.info
+        
         player_tag = encode_tag(player_tag)
         endpoint = f"players/{player_tag}"
         
@@ -103,6 +117,8 @@ def register_players_tools(mcp):
     #     return result
 
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_player_battle_log(player_tag: str) -> dict:
         """
         Fetch battle log for a player from the Clash Royale API. A player tag must be provided to look up a player.
@@ -117,9 +133,19 @@ def register_players_tools(mcp):
         """
         logger.info(f"get_player_battle_log called with player_tag: {player_tag}")
         
+        # Watched players are answered from the watchlist, limited to the API's own window.
+        # The full accumulated history is available through get_watched_player_history
+        watched = get_watchlist().get_fresh(player_tag)
+        if watched is not None:
+            result = watched.battles[:watched.log_window]
+            logger.info(f"get_player_battle_log served from watchlist. Found {len(result)} battles")
+            return result
+        
         player_tag = encode_tag(player_tag)
         endpoint = f"players/{player_tag}/battlelog"
         
         result = make_api_request(endpoint)
         logger.info(f"get_player_battle_log completed successfully. Found {len(result)} battles")
-        return result
\ No newline at end of file
+        return result
+
+    return [get_player_info, get_player_battle_log]
@@ -0,0 +1,300 @@
+import os
+import re
+import json
+import asyncio
+import logging
+from mcp.server.fastmcp.tools import Tool
+from .deadline import with_deadline, check
+from .results import guard_result_size, full_results, project_fields
+
+logger = logging.getLogger(__name__)
+
+CR_QUERY_MAX_STEPS = int(os.getenv("CR_QUERY_MAX_STEPS", "10"))
+# Most calls a single foreach step may make, each one costs an upstream request unless it is cached
+CR_QUERY_MAX_FANOUT = int(os.getenv("CR_QUERY_MAX_FANOUT", "25"))
+CR_QUERY_MAX_PARALLEL = int(os.getenv("CR_QUERY_MAX_PARALLEL", "8"))
+
+# Tools with side effects, which a plan may not call
+EXCLUDED_TOOLS = {"watch_player", "unwatch_player"}
+
+FILTER_OPS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a is not None and a > b,
+    ">=": lambda a, b: a is not None and a >= b,
+    "<": lambda a, b: a is not None and a < b,
+    "<=": lambda a, b: a is not None and a <= b,
+    "in": lambda a, b: a in b,
+    "contains": lambda a, b: a is not None and str(b).lower() in str(a).lower(),
+}
+
+_REFERENCE = re.compile(r"^\$([A-Za-z_][\w-]*)(.*)$")
+_PATH_TOKEN = re.compile(r"\.?([^.\[\]]+)|\[(-?\d+)\]")
+
+
+def _resolve_path(value, path: str):
+    """
+    Follow a path like "items[0].tag" into a value. A key applied to a list is applied to every
+    item, so "items.tag" is the list of all tags.
+    """
+    for key, index in _PATH_TOKEN.findall(path):
+        if index:
+            value = value[int(index)] if isinstance(value, list) and -len(value) <= int(index) < len(value) else None
+        elif isinstance(value, list):
+            value = [item.get(key) if isinstance(item, dict) else None for item in value]
+        else:
+            value = value.get(key) if isinstance(value, dict) else None
+    return value
+
+
+def _references(value) -> set[str]:
+    """
+    Names referenced by an argument value ("$name..." strings, also inside lists).
+    """
+    if isinstance(value, str):
+        match = _REFERENCE.match(value)
+        return {match.group(1)} if match else set()
+    if isinstance(value, list):
+        return set().union(*map(_references, value)) if value else set()
+    return set()
+
+
+def _substitute(value, scope: dict):
+    if isinstance(value, str):
+        match = _REFERENCE.match(value)
+        if match:
+            return _resolve_path(scope[match.group(1)], match.group(2))
+        return value
+    if isinstance(value, list):
+        return [_substitute(item, scope) for item in value]
+    return value
+
+
+def _bind(args: dict, scope: dict) -> dict:
+    """
+    Replace the references in a step's args with the values they point to.
+    """
+    return {name: _substitute(value, scope) for name, value in args.items()}
+
+
+def _validate(steps: list[dict], output: str, tools: dict) -> dict:
+    """
+    Check a plan and work out the dependencies of each step.
+
+    Returns:
+        A dict of step id -> set of step ids it depends on
+    """
+    if not steps:
+        raise ValueError("The plan has no steps.")
+    if len(steps) > CR_QUERY_MAX_STEPS:
+        raise ValueError(f"The plan has {len(steps)} steps, at most {CR_QUERY_MAX_STEPS} are allowed.")
+
+    dependencies = {}
+    for position, step in enumerate(steps):
+        step_id = step.get("id")
+        if not isinstance(step_id, str) or not step_id or step_id == "item":
+            raise ValueError(f"Step {position} needs a unique string id (other than 'item').")
+        if step_id in dependencies:
+            raise ValueError(f"Step id '{step_id}' is used more than once.")
+
+        tool_name = step.get("tool")
+        if tool_name not in tools:
+            raise ValueError(f"Step '{step_id}' uses '{tool_name}', which is not a tool a plan can call.")
+
+        args = step.get("args") or {}
+        if not isinstance(args, dict):
+            raise ValueError(f"Step '{step_id}': args must be an object of tool argument names to values.")
+        unknown_args = set(args) - set(tools[tool_name].fn_metadata.arg_model.model_fields)
+        if unknown_args:
+            raise ValueError(f"Step '{step_id}': {tool_name} has no argument(s) {sorted(unknown_args)}.")
+
+        referenced = set().union(*map(_references, args.values())) if args else set()
+        foreach = step.get("foreach")
+        if foreach is not None:
+            if not _references(foreach) or "item" in _references(foreach):
+                raise ValueError(f"Step '{step_id}': foreach must reference an earlier step, e.g. \"$members.items\".")
+            referenced |= _references(foreach)
+        elif "item" in referenced:
+            raise ValueError(f"Step '{step_id}' references $item but has no foreach.")
+
+        unknown = referenced - set(dependencies) - {"item"}
+        if unknown:
+            raise ValueError(f"Step '{step_id}' references {sorted(unknown)}, only earlier steps can be referenced.")
+
+        for condition in step.get("filter") or []:
+            if condition.get("op", "==") not in FILTER_OPS:
+                raise ValueError(f"Step '{step_id}': unknown filter op '{condition.get('op')}', use one of {list(FILTER_OPS)}.")
+
+        dependencies[step_id] = referenced - {"item"}
+
+    if output is not None and output not in dependencies:
+        raise ValueError(f"Output step '{output}' is not in the plan.")
+    return dependencies
+
+
+def _shape(step: dict, result):
+    """
+    Apply a step's filter, sort, limit and fields to its (selected) result.
+    """
+    filters, sort, limit, fields = step.get("filter"), step.get("sort"), step.get("limit"), step.get("fields")
+
+    if (filters or sort or limit is not None) and not isinstance(result, list):
+        raise ValueError("filter, sort and limit need a list, use select to pick one (e.g. \"items\").")
+
+    for condition in filters or []:
+        compare = FILTER_OPS[condition.get("op", "==")]
+        field, expected = condition.get("field", ""), condition.get("value")
+        result = [item for item in result if _safe(compare, _resolve_path(item, field), expected)]
+
+    if sort:
+        descending = sort.startswith("-")
+        field = sort.lstrip("-")
+        present = [item for item in result if _resolve_path(item, field) is not None]
+        missing = [item for item in result if _resolve_path(item, field) is None]
+        result = sorted(present, key=lambda item: _resolve_path(item, field), reverse=descending) + missing
+
+    if limit is not None:
+        result = result[:limit]
+
+    if fields:
+        result = [project_fields(item, fields) for item in result] if isinstance(result, list) else project_fields(result, fields)
+    return result
+
+
+def _safe(compare, actual, expected) -> bool:
+    try:
+        return bool(compare(actual, expected))
+    except TypeError:
+        return False
+
+
+def register_query_tools(mcp, tool_functions: list):
+    """
+    Register the query planner tool with the MCP server.
+
+    Args:
+        mcp: The FastMCP server instance
+        tool_functions: The tool functions plans may call, as returned by the other register functions
+
+    Returns:
+        The registered tool functions
+    """
+    tools = {}
+
+    def get_tools() -> dict:
+        # Built on first use, the argument models are only needed once a plan runs
+        if not tools:
+            tools.update({fn.__name__: Tool.from_function(fn) for fn in tool_functions if fn.__name__ not in EXCLUDED_TOOLS})
+        return tools
+
+    @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
+    async def run_query(steps: list[dict], output: str = None) -> dict:
+        """
+        Run a chain of tool calls in one go and return only the final data, instead of calling the tools one at a
+        time. Use this when a question needs several dependent lookups, e.g. find a clan by name, get its members,
+        then get the player info of its best members. Steps that don't depend on each other run in parallel, and
+        repeated calls are only made once.
+
+        Each step is an object with:
+            id: A name for the step, later steps reference its result as "$<id>".
+            tool: The tool to call, any of the other tools (except fetch_result_slice, watch_player and unwatch_player).
+            args: The tool's arguments. A string value starting with "$" is a reference to an earlier step's result,
+                followed by a path, e.g. "$clans.items[0].tag" is the tag of the first item of step "clans".
+                A key applied to a list is applied to every item, "$clans.items.tag" is the list of all tags.
+            foreach: (optional) A reference to a list in an earlier step, e.g. "$members". The tool is called once per
+                item, and "$item" in args refers to the current item (e.g. {"player_tag": "$item.tag"}). The step's
+                result is the list of every call's result.
+            select: (optional) Path into the tool's result to keep, e.g. "items" or "memberList". For foreach steps
+                it applies to each call's result.
+            filter: (optional) List of conditions all items must match, each {"field": ..., "op": ..., "value": ...}
+                with op one of ==, !=, >, >=, <, <=, in, contains (case-insensitive substring).
+            sort: (optional) Field to sort items by, prefixed with "-" for descending, e.g. "-trophies".
+            limit: (optional) Keep only the first N items, after filter and sort.
+            fields: (optional) Keep only these fields of each item, dotted names reach into nested objects.
+
+        Example, the three best members of the clan named "Vanguard", with their card levels:
+            [
+                {"id": "clans", "tool": "search_clans", "args": {"name": "Vanguard", "limit": 1}},
+                {"id": "members", "tool": "get_clan_members", "args": {"clan_tag": "$clans.items[0].tag"},
+                 "select": "items", "sort": "-trophies", "limit": 3, "fields": ["tag"]},
+                {"id": "players", "tool": "get_player_info", "foreach": "$members", "args": {"player_tag": "$item.tag"},
+                 "fields": ["name", "trophies", "bestTrophies", "cards"]}
+            ]
+
+        Args:
+            steps: The steps of the plan, in order. A step can only reference steps before it.
+
+            output: Id of the step whose result to return. Defaults to the last step. (optional)
+
+        Returns:
+            The output step's result after its select, filter, sort, limit and fields are applied.
+        """
+        logger.info(f"run_query called with {len(steps)} steps, output={output}")
+
+        plannable = get_tools()
+        dependencies = _validate(steps, output, plannable)
+        output = output or steps[-1]["id"]
+
+        semaphore = asyncio.Semaphore(CR_QUERY_MAX_PARALLEL)
+        calls = {}
+
+        async def call(tool_name: str, args: dict):
+            tool = plannable[tool_name]
+            # Validated and coerced the same way FastMCP does for calls from the model
+            metadata = tool.fn_metadata
+            kwargs = metadata.arg_model.model_validate(metadata.pre_parse_json(args)).model_dump_one_level()
+            check()
+            async with semaphore:
+                check()
+                return await asyncio.to_thread(tool.fn, **kwargs)
+
+        def call_once(tool_name: str, args: dict):
+            key = (tool_name, json.dumps(args, sort_keys=True, default=str))
+            if key not in calls:
+                calls[key] = asyncio.ensure_future(call(tool_name, args))
+            return calls[key]
+
+        results = {}
+        tasks = {}
+
+        async def run_step(step: dict):
+            step_id, tool_name, args = step["id"], step["tool"], step.get("args") or {}
+            # Each step starts as soon as the steps it references are done, independent of the rest of the plan
+            await asyncio.gather(*(tasks[dependency] for dependency in dependencies[step_id]))
+            try:
+                if step.get("foreach") is not None:
+                    items = _substitute(step["foreach"], results)
+                    if not isinstance(items, list):
+                        raise ValueError(f"foreach {step['foreach']} is not a list.")
+                    if len(items) > CR_QUERY_MAX_FANOUT:
+                        raise ValueError(f"foreach {step['foreach']} has {len(items)} items, at most {CR_QUERY_MAX_FANOUT} are allowed. "
+                                         f"Add a limit to the step it references.")
+                    outputs = await asyncio.gather(*(
+                        call_once(tool_name, _bind(args, {**results, "item": item})) for item in items
+                    ))
+                    result = [_resolve_path(value, step["select"]) if step.get("select") else value for value in outputs]
+                else:
+                    result = await call_once(tool_name, _bind(args, results))
+                    if step.get("select"):
+                        result = _resolve_path(result, step["select"])
+                results[step_id] = _shape(step, result)
+            except Exception as e:
+                raise ValueError(f"Step '{step_id}' ({tool_name}) failed: {e}") from e
+
+        with full_results():
+            # Steps only reference earlier steps, so every dependency's task exists when a step's task is created
+            for step in steps:
+                tasks[step["id"]] = asyncio.ensure_future(run_step(step))
+            try:
+                await asyncio.gather(*tasks.values())
+            except BaseException:
+                for future in [*tasks.values(), *calls.values()]:
+                    future.cancel()
+                raise
+
+        logger.info(f"run_query completed successfully. Ran {len(steps)} steps with {len(calls)} tool calls")
+        return {"output": output, "result": results[output]}
+
+    return [run_query]
@@ -1,5 +1,7 @@
 import logging
 from .utils import make_api_request, build_query_string, encode_tag
+from .deadline import with_deadline
+from .results import guard_result_size
 
 logger = logging.getLogger(__name__)
 
@@ -9,9 +11,14 @@ def register_ranking_tools(mcp):
 
     Args:
         mcp: The FastMCP server instance
+
+    Returns:
+        The registered tool functions
     """
     
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_locations() -> dict:
         """
         Fetch a list of all the available locations alongside their ids from the Clash Royale API.
@@ -28,6 +35,8 @@ def register_ranking_tools(mcp):
         return result
 
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_seasons() -> dict:
         """
         Fetch a list of all the available seasons alongside their ids from the Clash Royale API.
@@ -46,6 +55,8 @@ def register_ranking_tools(mcp):
     
     # Path of legends ranking tools
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_location_path_of_legends_player_rankings(
         location_id: int,
         limit: int = None,
@@ -93,6 +104,8 @@ def register_ranking_tools(mcp):
         return result
     
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_top_path_of_legends_players_rankings(
         season_id: str,
         limit: int = None,
@@ -144,6 +157,8 @@ def register_ranking_tools(mcp):
     
     # Clan ranking tools
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_location_clan_rankings(
         location_id: int,
         limit: int = None,
@@ -191,6 +206,8 @@ def register_ranking_tools(mcp):
         return result
 
     @mcp.tool()
+    @guard_result_size()
+    @with_deadline()
     def get_location_clan_war_rankings(
         location_id: int,
         limit: int = None,
@@ -287,4 +304,13 @@ def register_ranking_tools(mcp):
         
     #     result = make_api_request(endpoint)
     #     logger.info(f"get_global_tournament_rankings completed successfully. Found {len(result)} tournament rankings")
-    #     return result
\ No newline at end of file
+    #     return result
+
+    return [
+        get_locations,
+        get_seasons,
+        get_location_path_of_legends_player_rankings,
+        get_top_path_of_legends_players_rankings,
+        get_location_clan_rankings,
+        get_location_clan_war_rankings,
+    ]
@@ -0,0 +1,104 @@
+import os
+import gzip
+import json
+import time
+import atexit
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Recorder:
+    """
+    Appends upstream responses to a gzip-compressed JSON lines archive, one record per response with
+    the endpoint, status code, response body and how long the request took.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def record(self, endpoint: str, status: int, body: str, elapsed: float) -> None:
+        """
+        Append a response to the archive.
+
+        Args:
+            endpoint: The API endpoint that was called
+            status: The HTTP status code
+            body: The response body
+            elapsed: Seconds the request took
+        """
+        line = json.dumps({"endpoint": endpoint, "status": status, "elapsed": round(elapsed, 4), "body": body}, separators=(",", ":"))
+        with self._lock:
+            if self._file is None:
+                # Every run appends its own gzip member, readers see the members as one stream
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = gzip.open(self.path, "at", encoding="utf-8")
+                atexit.register(self.close)
+            self._file.write(line + "\n")
+            # Sync flush so the archive is readable up to here even if the server is killed
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class Replayer:
+    """
+    Serves responses from an archive written by Recorder. Each endpoint's recorded responses are
+    served in the order they were recorded, starting over once they run out, so a replay run is
+    deterministic for a given sequence of calls.
+    """
+
+    def __init__(self, path: str, emulate_timing: bool = False, speed: float = 1.0):
+        self.path = path
+        self.emulate_timing = emulate_timing
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._records = None
+        self._positions = {}
+
+    def _load(self) -> dict:
+        records = {}
+        with gzip.open(self.path, "rt", encoding="utf-8") as archive:
+            try:
+                for line in archive:
+                    record = json.loads(line)
+                    records.setdefault(record["endpoint"], []).append(record)
+            except (EOFError, json.JSONDecodeError):
+                # The recording server was killed before closing the archive, the last record may be cut off
+                logger.warning(f"Archive {self.path} ends with a truncated record, ignoring it")
+        logger.info(f"Loaded {sum(len(r) for r in records.values())} recorded responses for {len(records)} endpoints from {self.path}")
+        return records
+
+    def replay(self, endpoint: str) -> tuple[int, str]:
+        """
+        Get the next recorded response for an endpoint, waiting as long as the original request took
+        (divided by `speed`) if timing emulation is on.
+
+        Args:
+            endpoint: The API endpoint to replay
+
+        Returns:
+            The recorded status code and response body
+        """
+        with self._lock:
+            if self._records is None:
+                self._records = self._load()
+
+            responses = self._records.get(endpoint)
+            if not responses:
+                raise Exception(f"No recorded response for {endpoint} in {self.path}")
+
+            position = self._positions.get(endpoint, 0)
+            self._positions[endpoint] = position + 1
+            record = responses[position % len(responses)]
+
+        if self.emulate_timing:
+            time.sleep(record["elapsed"] / self.speed)
+        return record["status"], record["body"]
@@ -0,0 +1,322 @@
+import os
+import json
+import inspect
+import logging
+import secrets
+import functools
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from . import metrics, utils
+from .state import get_state_backend, StateBackendError
+
+logger = logging.getLogger(__name__)
+
+# Largest tool result, in bytes of compact JSON, returned to the model as is. Bigger results are
+# summarized and stored under a handle the model can page through with fetch_result_slice.
+CR_RESULT_BUDGET_BYTES = int(os.getenv("CR_RESULT_BUDGET_BYTES", "24000"))
+CR_RESULT_HANDLE_TTL_SECONDS = float(os.getenv("CR_RESULT_HANDLE_TTL_SECONDS", "900"))
+
+# Per-tool budgets, overridable with CR_RESULT_BUDGETS, e.g. "search_clans=10000,get_player_info=40000".
+# Player info carries the full card collection, which the model usually needs whole
+RESULT_BUDGETS = {
+    "get_player_info": 48000,
+}
+for override in filter(None, os.getenv("CR_RESULT_BUDGETS", "").split(",")):
+    tool_name, budget = override.split("=")
+    RESULT_BUDGETS[tool_name.strip()] = int(budget)
+
+TOP_K = 5
+# Items inspected per list when computing field stats
+STATS_SAMPLE = 1000
+
+# Set while results are consumed by the server itself rather than returned to the model
+_full_results = ContextVar("spill_disabled", default=False)
+
+
+def _size(value) -> int:
+    return len(json.dumps(value, separators=(",", ":")))
+
+
+def _items_of(result, path: str = None) -> list:
+    """
+    Find the list to summarize or slice in a result: the result itself if it is a list, the list
+    under `path`, or the API's usual "items" list.
+    """
+    if path:
+        value = result
+        for key in path.split("."):
+            value = value.get(key) if isinstance(value, dict) else None
+        if not isinstance(value, list):
+            raise ValueError(f"No list found at path '{path}' in this result.")
+        return value
+    if isinstance(result, list):
+        return result
+    if isinstance(result, dict) and isinstance(result.get("items"), list):
+        return result["items"]
+    raise ValueError("This result has no top-level list, pass the path of the list to slice.")
+
+
+def _list_paths(value, prefix: str = "", depth: int = 2) -> dict:
+    """
+    Dotted paths of the lists in a result, up to `depth` levels of objects deep, with their lengths.
+    """
+    paths = {}
+    if depth == 0 or not isinstance(value, dict):
+        return paths
+    for key, child in value.items():
+        path = f"{prefix}{key}"
+        if isinstance(child, list):
+            paths[path] = len(child)
+        else:
+            paths.update(_list_paths(child, f"{path}.", depth - 1))
+    return paths
+
+
+def project_fields(item, fields: list[str]):
+    """
+    Keep only the given fields of an item, dotted fields (e.g. "clan.name") reach into nested objects.
+    """
+    if not fields or not isinstance(item, dict):
+        return item
+
+    projected = {}
+    for field in fields:
+        value, target, keys = item, projected, field.split(".")
+        for key in keys:
+            value = value.get(key) if isinstance(value, dict) else None
+        for key in keys[:-1]:
+            target = target.setdefault(key, {})
+        target[keys[-1]] = value
+    return projected
+
+
+def _field_stats(items: list) -> dict:
+    """
+    Per-field stats over a list of objects: min/max/mean for numbers, distinct count and most common
+    values for strings, and how many items have the field.
+    """
+    values = {}
+    for item in items[:STATS_SAMPLE]:
+        if not isinstance(item, dict):
+            continue
+        for key, value in item.items():
+            values.setdefault(key, []).append(value)
+
+    stats = {}
+    for key, field_values in values.items():
+        numbers = [value for value in field_values if isinstance(value, (int, float)) and not isinstance(value, bool)]
+        strings = [value for value in field_values if isinstance(value, str)]
+        field = {"present": len(field_values)}
+        if numbers:
+            field.update(min=min(numbers), max=max(numbers), mean=round(sum(numbers) / len(numbers), 2))
+        elif strings:
+            counts = Counter(strings)
+            field["distinct"] = len(counts)
+            # Most common values only say something when values repeat
+            if len(counts) < len(strings):
+                field["top"] = [value for value, _ in counts.most_common(TOP_K)]
+        else:
+            field["type"] = type(field_values[0]).__name__
+        stats[key] = field
+    return stats
+
+
+def _scalars(item):
+    if not isinstance(item, dict):
+        return item
+    return {key: value for key, value in item.items() if not isinstance(value, (dict, list))}
+
+
+def summarize(result) -> dict:
+    """
+    Compact summary of a result: scalar fields are kept, lists are replaced by their length, field stats
+    and a preview of the first few items, and large nested objects by their keys.
+
+    Args:
+        result: The tool result to summarize
+
+    Returns:
+        The summary
+    """
+    if isinstance(result, list):
+        return {
+            "count": len(result),
+            "fields": _field_stats(result),
+            "preview": [_scalars(item) for item in result[:TOP_K]],
+        }
+    if not isinstance(result, dict):
+        return result
+
+    summary = {}
+    for key, value in result.items():
+        if isinstance(value, list):
+            summary[key] = summarize(value)
+        elif isinstance(value, dict) and _size(value) > 500:
+            summary[key] = {"keys": list(value)}
+        else:
+            summary[key] = value
+    return summary
+
+
+def _store_result(handle: str, stored: bytes):
+    key = f"cr:result:{handle}"
+    try:
+        get_state_backend().set(key, stored, CR_RESULT_HANDLE_TTL_SECONDS)
+    except StateBackendError as e:
+        logger.warning(f"{e}, storing result {handle} in the process-local backend")
+        metrics.increment("state_backend_errors")
+        utils._local_backend.set(key, stored, CR_RESULT_HANDLE_TTL_SECONDS)
+
+
+def _load_result(handle: str) -> bytes | None:
+    key = f"cr:result:{handle}"
+    try:
+        stored = get_state_backend().get(key)
+    except StateBackendError as e:
+        logger.warning(f"{e}, looking up result {handle} in the process-local backend")
+        metrics.increment("state_backend_errors")
+        stored = None
+    # Results stored while the backend was down are only in the process-local one
+    return stored if stored is not None else utils._local_backend.get(key)
+
+
+def guard_result_size(budget: int = None):
+    """
+    Decorator enforcing a result size budget on a tool. Results over budget are stored under a
+    short-lived handle and replaced by a summary.
+
+    Args:
+        budget: The budget in bytes, defaults to the tool's entry in RESULT_BUDGETS or CR_RESULT_BUDGET_BYTES
+    """
+    def decorator(fn):
+        tool_budget = budget or RESULT_BUDGETS.get(fn.__name__, CR_RESULT_BUDGET_BYTES)
+
+        def guard(result):
+            if _full_results.get():
+                return result
+
+            size = _size(result)
+            if size <= tool_budget:
+                return result
+
+            handle = secrets.token_urlsafe(8)
+            _store_result(handle, json.dumps(result).encode())
+            logger.info(f"{fn.__name__} result of {size} bytes is over its {tool_budget} byte budget, stored as {handle}")
+            note = (
+                "The full result was too large to return and was summarized. Use the fetch_result_slice tool "
+                "with this handle to page through the list items, optionally only the fields you need."
+            )
+            try:
+                _items_of(result)
+            except ValueError:
+                # fetch_result_slice can't find the list on its own, name the ones it can page through
+                paths = sorted(_list_paths(result).items(), key=lambda entry: entry[1], reverse=True)
+                if paths:
+                    lists = ", ".join(f"{path} ({count} items)" for path, count in paths)
+                    note += f' Pass the path of the list to page through, e.g. path="{paths[0][0]}". Lists in this result: {lists}.'
+            return {
+                "truncated": True,
+                "handle": handle,
+                "sizeBytes": size,
+                "note": note,
+                "summary": summarize(result),
+            }
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                return guard(await fn(*args, **kwargs))
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return guard(fn(*args, **kwargs))
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def full_results():
+    """
+    Context manager under which guarded tools return their full result, for callers inside the server.
+    """
+    token = _full_results.set(True)
+    try:
+        yield
+    finally:
+        _full_results.reset(token)
+
+
+def register_result_tools(mcp):
+    """
+    Register the tools for reading stored results with the MCP server.
+
+    Args:
+        mcp: The FastMCP server instance
+
+    Returns:
+        The registered tool functions
+    """
+
+    @mcp.tool()
+    def fetch_result_slice(
+        handle: str,
+        offset: int = 0,
+        fields: list[str] = None,
+        limit: int = None,
+        path: str = None,
+        ) -> dict:
+        """
+        Page through a tool result that was too large to return and was summarized instead. Only use this with a
+        handle from a result that has "truncated": true.
+
+        Args:
+            handle: The handle from the truncated result.
+
+            offset: Index of the first list item to return. Defaults to 0.
+
+            fields: Only return these fields of each item, dotted names reach into nested objects (e.g. ["name", "clan.name"]).
+                Requesting only the fields needed fits many more items per call. (optional)
+
+            limit: Maximum number of items to return. Fewer are returned if they don't fit the size budget. (optional)
+
+            path: Key of the list to page through when the result isn't a list or an object with "items",
+                dotted keys reach into nested objects (e.g. "cards" for player info, "result" for run_query). (optional)
+
+        Returns:
+            The requested items, the total number of items, and the offset to pass next if there are more.
+        """
+        logger.info(f"fetch_result_slice called with handle={handle}, offset={offset}, fields={fields}, limit={limit}, path={path}")
+
+        if offset < 0:
+            raise ValueError("offset must be 0 or more.")
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be 1 or more.")
+
+        stored = _load_result(handle)
+        if stored is None:
+            raise ValueError(f"Result handle {handle} is unknown or expired, call the original tool again.")
+
+        items = _items_of(json.loads(stored), path)
+        end = len(items) if limit is None else min(len(items), offset + limit)
+
+        page, size = [], 0
+        for item in items[offset:end]:
+            projected = project_fields(item, fields)
+            size += _size(projected)
+            if page and size > CR_RESULT_BUDGET_BYTES:
+                break
+            page.append(projected)
+
+        next_offset = offset + len(page)
+        result = {"total": len(items), "offset": offset, "items": page}
+        if next_offset < len(items):
+            result["nextOffset"] = next_offset
+        logger.info(f"fetch_result_slice completed successfully. Returned {len(page)} of {len(items)} items")
+        return result
+
+    return [fetch_result_slice]
@@ -0,0 +1,389 @@
+import os
+import heapq
+import socket
+import threading
+import time
+import uuid
+import logging
+from abc import ABC, abstractmethod
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+# After failing to reach a Redis-protocol server, calls fail fast for this long before it is tried again
+RECONNECT_BACKOFF_SECONDS = 5
+
+
+class StateBackendError(Exception):
+    """The state backend could not be reached or answered with an error."""
+
+
+class StateBackend(ABC):
+    """
+    Storage for the state make_api_request shares between calls: cached responses, single-flight
+    locks and rate-limit token buckets. Every replica pointed at the same backend behaves like one
+    client of the Clash Royale API.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        """
+        Get a value.
+
+        Args:
+            key: The key to look up
+
+        Returns:
+            The stored value, or None if it is missing or expired
+        """
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        """
+        Store a value.
+
+        Args:
+            key: The key to store the value under
+            value: The value to store
+            ttl: Seconds until the value expires
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """
+        Delete a value if it exists.
+
+        Args:
+            key: The key to delete
+        """
+
+    @abstractmethod
+    def acquire_lock(self, key: str, ttl: float) -> str | None:
+        """
+        Try to take a lock without blocking.
+
+        Args:
+            key: The lock name
+            ttl: Seconds after which the lock is released automatically, in case the holder dies
+
+        Returns:
+            A token to pass to release_lock, or None if someone else holds the lock
+        """
+
+    @abstractmethod
+    def release_lock(self, key: str, token: str) -> None:
+        """
+        Release a lock, only if it is still held with the given token.
+
+        Args:
+            key: The lock name
+            token: The token returned by acquire_lock
+        """
+
+    @abstractmethod
+    def take_token(self, bucket: str, rate: float, capacity: int, max_wait: float = None) -> float | None:
+        """
+        Reserve one token from a token bucket. Callers wait out the returned delay before using it,
+        so concurrent callers are spread out at `rate`.
+
+        Args:
+            bucket: The bucket name
+            rate: Tokens added per second
+            capacity: Maximum number of tokens the bucket holds (the allowed burst)
+            max_wait: Longest delay the caller accepts, if the token would only be valid later nothing
+                is reserved. No limit by default
+
+        Returns:
+            Seconds the caller has to wait before its token is valid (0 if it can go now), or None if
+            that would be longer than max_wait
+        """
+
+
+def _gcra(tat: float | None, now: float, rate: float, capacity: int) -> tuple[float, float]:
+    """
+    Token bucket expressed as GCRA, so a bucket is a single timestamp (the theoretical arrival
+    time of the next token) instead of a count plus a refill time.
+
+    Returns:
+        The new arrival time to store and the seconds the caller has to wait
+    """
+    interval = 1 / rate
+    tolerance = (capacity - 1) * interval
+    tat = max(tat or now, now)
+    wait = max(0.0, tat - tolerance - now)
+    return tat + interval, wait
+
+
+class MemoryStateBackend(StateBackend):
+    """
+    Process-local backend, the default. Only coordinates calls within one server process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        # (expires_at, key) of every stored value, so expired values are dropped even if
+        # their key is never read again (result handles, one-off endpoints)
+        self._expiries = []
+        # Buckets never expire on their own, they are just a timestamp each
+        self._bucket_tats = {}
+
+    def _put(self, key: str, value, ttl: float):
+        now = time.monotonic()
+        while self._expiries and self._expiries[0][0] <= now:
+            expires_at, expired_key = heapq.heappop(self._expiries)
+            # The key may have been set again since, then its entry has a later expiry
+            entry = self._values.get(expired_key)
+            if entry is not None and entry[1] == expires_at:
+                del self._values[expired_key]
+
+        self._values[key] = (value, now + ttl)
+        heapq.heappush(self._expiries, (now + ttl, key))
+
+    def _get_unexpired(self, key: str):
+        entry = self._values.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._values[key]
+            return None
+        return value
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            return self._get_unexpired(key)
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        with self._lock:
+            self._put(key, value, ttl)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._values.pop(key, None)
+
+    def acquire_lock(self, key: str, ttl: float) -> str | None:
+        with self._lock:
+            if self._get_unexpired(key) is not None:
+                return None
+            token = uuid.uuid4().hex
+            self._put(key, token, ttl)
+            return token
+
+    def release_lock(self, key: str, token: str) -> None:
+        with self._lock:
+            if self._get_unexpired(key) == token:
+                del self._values[key]
+
+    def take_token(self, bucket: str, rate: float, capacity: int, max_wait: float = None) -> float | None:
+        with self._lock:
+            now = time.monotonic()
+            tat, wait = _gcra(self._bucket_tats.get(bucket), now, rate, capacity)
+            if max_wait is not None and wait > max_wait:
+                return None
+            self._bucket_tats[bucket] = tat
+            return wait
+
+
+class RedisError(StateBackendError):
+    """Error reply from a Redis-protocol server."""
+
+
+class RedisStateBackend(StateBackend):
+    """
+    Backend for any server speaking the Redis protocol (Redis, Valkey, KeyDB, or a local stand-in),
+    using a small built-in RESP client over one connection. Only plain commands and WATCH/MULTI/EXEC
+    transactions are used, no Lua scripting.
+    """
+
+    def __init__(self, url: str, timeout: float = 5.0):
+        parsed = urlparse(url)
+        if parsed.scheme != "redis":
+            raise ValueError(f"Unsupported state backend url: {url}")
+
+        self._host = parsed.hostname or "localhost"
+        self._port = parsed.port or 6379
+        self._password = parsed.password
+        self._db = int(parsed.path.lstrip("/") or 0)
+        self._timeout = timeout
+
+        self._lock = threading.Lock()
+        self._sock = None
+        self._reader = None
+        self._unavailable_until = 0.0
+
+    def _connect(self):
+        self._sock = socket.create_connection((self._host, self._port), timeout=self._timeout)
+        self._reader = self._sock.makefile("rb")
+
+        if self._password:
+            self._send("AUTH", self._password)
+        if self._db:
+            self._send("SELECT", self._db)
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._reader = None
+
+    def _read_reply(self):
+        line = self._reader.readline()
+        if not line:
+            raise ConnectionError("Connection closed by state backend")
+
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b"+":
+            # Kept as bytes like bulk strings, some stand-ins answer GET with simple strings
+            return payload
+        if prefix == b"-":
+            raise RedisError(payload.decode())
+        if prefix == b":":
+            return int(payload)
+        if prefix == b"$":
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._reader.read(length + 2)
+            return data[:-2]
+        if prefix == b"*":
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RedisError(f"Unexpected reply from state backend: {line!r}")
+
+    def _send(self, *args):
+        parts = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            data = arg if isinstance(arg, bytes) else str(arg).encode()
+            parts.append(f"${len(data)}\r\n".encode() + data + b"\r\n")
+        self._sock.sendall(b"".join(parts))
+        return self._read_reply()
+
+    def _execute(self, fn):
+        """
+        Run fn with the connection held, reconnecting once if an established connection was lost.
+        Raises StateBackendError if the server can't be reached, and fails fast for
+        RECONNECT_BACKOFF_SECONDS after that instead of waiting on connect timeouts every call.
+        """
+        with self._lock:
+            if time.monotonic() < self._unavailable_until:
+                raise StateBackendError(f"State backend {self._host}:{self._port} is unavailable")
+            try:
+                return self._execute_with_retry(fn)
+            except (ConnectionError, OSError) as e:
+                self._unavailable_until = time.monotonic() + RECONNECT_BACKOFF_SECONDS
+                raise StateBackendError(f"Could not reach state backend {self._host}:{self._port}: {e}") from e
+
+    def _execute_with_retry(self, fn):
+        for attempt in range(2):
+            fresh = self._sock is None
+            try:
+                if fresh:
+                    self._connect()
+                return fn()
+            except (ConnectionError, OSError):
+                self._close()
+                # A connection that just failed to open isn't retried, only one that was lost
+                if fresh or attempt:
+                    raise
+                logger.warning("Lost connection to state backend, reconnecting")
+            except RedisError:
+                # Leave the connection in a clean state if a transaction was open
+                self._close()
+                raise
+
+    def _now(self) -> float:
+        seconds, microseconds = self._send("TIME")
+        return int(seconds) + int(microseconds) / 1_000_000
+
+    def get(self, key: str) -> bytes | None:
+        return self._execute(lambda: self._send("GET", key))
+
+    def set(self, key: str, value: bytes, ttl: float) -> None:
+        self._execute(lambda: self._send("SET", key, value, "PX", max(1, int(ttl * 1000))))
+
+    def delete(self, key: str) -> None:
+        self._execute(lambda: self._send("DEL", key))
+
+    def acquire_lock(self, key: str, ttl: float) -> str | None:
+        token = uuid.uuid4().hex
+        reply = self._execute(lambda: self._send("SET", key, token, "PX", max(1, int(ttl * 1000)), "NX"))
+        return token if reply == b"OK" else None
+
+    def release_lock(self, key: str, token: str) -> None:
+        def release():
+            self._send("WATCH", key)
+            if self._send("GET", key) != token.encode():
+                self._send("UNWATCH")
+                return
+            self._send("MULTI")
+            self._send("DEL", key)
+            # A nil reply means the lock changed hands in between, which is fine to ignore
+            self._send("EXEC")
+
+        self._execute(release)
+
+    def take_token(self, bucket: str, rate: float, capacity: int, max_wait: float = None) -> float | None:
+        def take():
+            while True:
+                self._send("WATCH", bucket)
+                stored = self._send("GET", bucket)
+                now = self._now()
+                tat, wait = _gcra(float(stored) if stored is not None else None, now, rate, capacity)
+                if max_wait is not None and wait > max_wait:
+                    self._send("UNWATCH")
+                    return None
+
+                self._send("MULTI")
+                # Once the arrival time has passed the bucket is full again, so the key can expire then
+                self._send("SET", bucket, repr(tat), "PX", max(1, int((tat - now) * 1000) + 1000))
+                if self._send("EXEC") is not None:
+                    return wait
+
+        return self._execute(take)
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_state_backend() -> StateBackend:
+    """
+    Get the process-wide state backend, created on first use from CR_STATE_BACKEND
+    ("memory" or "redis") and CR_REDIS_URL.
+
+    Returns:
+        The configured state backend
+    """
+    global _backend
+
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                # Read here rather than at import so values set by the caller before first use apply
+                backend_name = os.getenv("CR_STATE_BACKEND", "memory")
+                if backend_name == "memory":
+                    _backend = MemoryStateBackend()
+                elif backend_name == "redis":
+                    _backend = RedisStateBackend(os.getenv("CR_REDIS_URL", "redis://localhost:6379/0"))
+                else:
+                    raise ValueError(f"Unknown CR_STATE_BACKEND: {backend_name}")
+                logger.info(f"Using {backend_name} state backend")
+
+    return _backend
+
+
+def set_state_backend(backend: StateBackend) -> None:
+    """
+    Replace the process-wide state backend, e.g. with one pointed at a local stand-in.
+
+    Args:
+        backend: The backend make_api_request should use from now on
+    """
+    global _backend
+    _backend = backend
@@ -1,53 +1,296 @@
 import os
-import requests
+import json
+import time
+import hashlib
 import logging
-from dotenv import load_dotenv
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+from . import deadline, metrics
+from .state import get_state_backend, MemoryStateBackend, StateBackendError
+from .recording import Recorder, Replayer
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
 logger = logging.getLogger(__name__)
 
-# Try to load environment variables from .env file
-dotenvPath = os.path.join(os.path.dirname(__file__), '..', '..', '.env')
-load_dotenv(dotenvPath)
-
 CR_API_BASE = "https://api.clashroyale.com/v1"
 CR_API_KEY = os.getenv("CR_API_KEY")
 
-# Validate API key
-if not CR_API_KEY:
+# live calls the API, record also saves every response to CR_ARCHIVE_PATH, and replay serves
+# responses from that archive without calling the API (see recording.py)
+CR_API_MODE = os.getenv("CR_API_MODE", "live")
+CR_ARCHIVE_PATH = os.getenv(
+    "CR_ARCHIVE_PATH",
+    os.path.join(os.path.dirname(__file__), '..', '..', 'data', 'api_archive.jsonl.gz'),
+)
+# In replay mode, wait as long as the recorded request took, divided by CR_REPLAY_SPEED
+CR_REPLAY_TIMING = os.getenv("CR_REPLAY_TIMING", "false").lower() == "true"
+CR_REPLAY_SPEED = float(os.getenv("CR_REPLAY_SPEED", "1"))
+
+if CR_API_MODE not in ("live", "record", "replay"):
+    raise ValueError(f"Unknown CR_API_MODE: {CR_API_MODE}")
+
+# Validate API key, replay never calls the API so it doesn't need one
+if not CR_API_KEY and CR_API_MODE != "replay":
     raise ValueError("CR_API_KEY environment variable is required")
 
-def make_api_request(endpoint: str) -> dict:
+_recorder = Recorder(CR_ARCHIVE_PATH) if CR_API_MODE == "record" else None
+_replayer = Replayer(CR_ARCHIVE_PATH, CR_REPLAY_TIMING, CR_REPLAY_SPEED) if CR_API_MODE == "replay" else None
+
+# Shared request state, see state.py. With a shared backend these limits apply across all replicas
+CR_CACHE_TTL_SECONDS = float(os.getenv("CR_CACHE_TTL_SECONDS", "30"))
+# How much longer an expired response is kept, to be served when upstream is too slow to answer in time
+CR_STALE_TTL_SECONDS = float(os.getenv("CR_STALE_TTL_SECONDS", "600"))
+CR_RATE_LIMIT_PER_SECOND = float(os.getenv("CR_RATE_LIMIT_PER_SECOND", "10"))
+CR_RATE_LIMIT_BURST = int(os.getenv("CR_RATE_LIMIT_BURST", "10"))
+# How long a request may hold the single-flight lock for an endpoint, and how long
+# other requests for the same endpoint wait on it before fetching anyway
+SINGLE_FLIGHT_LOCK_TTL = 30
+SINGLE_FLIGHT_WAIT = 10
+
+# Cap on a single upstream request, tool deadlines (see deadline.py) can cut it shorter
+CR_REQUEST_TIMEOUT_SECONDS = float(os.getenv("CR_REQUEST_TIMEOUT_SECONDS", "10"))
+# Hedged requests: when a request is slower than this percentile of recent latencies,
+# send a second one and take whichever answers first
+CR_HEDGE_ENABLED = os.getenv("CR_HEDGE_ENABLED", "false").lower() == "true"
+CR_HEDGE_PERCENTILE = float(os.getenv("CR_HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES = 20
+
+# Replayed responses are archived data, so replay keeps its cache, locks and rate accounting apart
+# from live state in case it is pointed at a shared backend
+_KEY_PREFIX = "cr:replay" if CR_API_MODE == "replay" else "cr"
+# Rate accounting is per API key, keyed by a digest so the key itself never reaches the backend
+_RATE_BUCKET = f"{_KEY_PREFIX}:rate:{hashlib.sha256((CR_API_KEY or CR_API_MODE).encode()).hexdigest()[:16]}"
+
+# Upstream requests run on worker threads so a stalled connection can be abandoned at the deadline
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="cr-api")
+_latencies = deque(maxlen=200)
+_latencies_lock = threading.Lock()
+
+# Used in place of the configured backend while that one can't be reached
+_local_backend = MemoryStateBackend()
+
+
+def _send(endpoint: str, timeout: float) -> dict:
+    """
+    Send a single GET request to the Clash Royale API, or replay it from the archive in replay mode.
+
+    Args:
+        endpoint: The API endpoint to call
+        timeout: Seconds to wait for the connection and for each read
+
+    Returns:
+        JSON response from the API
+    """
+    start = time.monotonic()
+    if _replayer is not None:
+        logger.info(f"Replaying API request to: {endpoint}")
+        status, body = _replayer.replay(endpoint)
+    else:
+        url = f"{CR_API_BASE}/{endpoint}"
+
+        logger.info(f"Making API request to: {url}")
+            
+        headers = {
+            "Authorization": f"Bearer {CR_API_KEY}"
+        }
+
+        # Imported on first use rather than at module load, requests and its
+        # dependencies are a large share of the server's import time
+        import requests
+
+        try:
+            response = requests.get(url, headers=headers, timeout=timeout)
+        except requests.Timeout as e:
+            raise TimeoutError(f"Request to {endpoint} timed out after {timeout:.1f}s") from e
+        status, body = response.status_code, response.text
+
+        if _recorder is not None:
+            # The archive is a side product, failing to write it must not fail the request
+            try:
+                _recorder.record(endpoint, status, body, time.monotonic() - start)
+            except Exception as e:
+                logger.error(f"Could not record response for {endpoint} to {_recorder.path}: {e}")
+                metrics.increment("record_errors")
+
+    if status == 200:
+        logger.info(f"API request successful. Response status: {status}")
+        with _latencies_lock:
+            _latencies.append(time.monotonic() - start)
+        return json.loads(body)
+    else:
+        logger.error(f"API request failed. Status: {status}, Response: {body}")
+        raise Exception(f"Error fetching data: {status} - {body}")
+
+
+def _hedge_delay() -> float | None:
+    """
+    The CR_HEDGE_PERCENTILE latency of recent successful requests, or None until there are enough samples.
+    """
+    with _latencies_lock:
+        if len(_latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        latencies = sorted(_latencies)
+    return latencies[min(len(latencies) - 1, int(len(latencies) * CR_HEDGE_PERCENTILE / 100))]
+
+
+def _take_rate_token(backend, max_wait: float = None) -> float | None:
+    return backend.take_token(_RATE_BUCKET, CR_RATE_LIMIT_PER_SECOND, CR_RATE_LIMIT_BURST, max_wait)
+
+
+def _fetch(endpoint: str, backend) -> dict:
+    """
+    Fetch an endpoint from the Clash Royale API, bypassing the cache. Waits for the rate limiter,
+    gives up at the current deadline, and hedges slow requests if enabled.
+
+    Args:
+        endpoint: The API endpoint to call
+        backend: The state backend holding the rate limit bucket
+
+    Returns:
+        JSON response from the API
+    """
+    deadline.check()
+    # Only reserve a token that becomes valid before the deadline, an unused reservation would delay every later request
+    wait = _take_rate_token(backend, deadline.remaining())
+    if wait is None:
+        raise deadline.DeadlineExceeded(f"Rate limited, {endpoint} could not be requested before the deadline.")
+    if wait > 0:
+        logger.info(f"Rate limit reached, waiting {wait:.2f}s before requesting {endpoint}")
+        time.sleep(wait)
+
+    deadline.check()
+    left = deadline.remaining()
+    timeout = CR_REQUEST_TIMEOUT_SECONDS if left is None else min(left, CR_REQUEST_TIMEOUT_SECONDS)
+    give_up_at = time.monotonic() + timeout
+
+    metrics.increment("upstream_requests")
+    primary = _executor.submit(_send, endpoint, timeout)
+    pending = {primary}
+
+    # Not in replay mode, where a hedge would consume a second recorded response for one request
+    hedge_delay = _hedge_delay() if CR_HEDGE_ENABLED and _replayer is None else None
+    if hedge_delay is not None and hedge_delay < timeout:
+        done, _ = wait_futures(pending, timeout=hedge_delay)
+        # A hedge is only sent when the rate limiter has a token to spare right away, otherwise nothing is reserved
+        hedge_timeout = give_up_at - time.monotonic()
+        if not done and hedge_timeout > 0 and _take_rate_token(backend, max_wait=0) is not None:
+            logger.info(f"Request to {endpoint} slower than {hedge_delay:.2f}s, sending hedged request")
+            metrics.increment("hedges_fired")
+            metrics.increment("upstream_requests")
+            pending.add(_executor.submit(_send, endpoint, hedge_timeout))
+
+    error = None
+    while pending:
+        done, pending = wait_futures(pending, timeout=max(0.0, give_up_at - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                if future is not primary:
+                    metrics.increment("hedges_won")
+                return future.result()
+            error = future.exception()
+
+    if error is not None and not pending:
+        raise error
+
+    metrics.increment("upstream_timeouts")
+    if left is not None and left <= CR_REQUEST_TIMEOUT_SECONDS:
+        raise deadline.DeadlineExceeded(f"Request to {endpoint} did not finish before the deadline.")
+    raise TimeoutError(f"Request to {endpoint} timed out after {timeout:.1f}s")
+
+
+def _get_cached(backend, cache_key: str) -> tuple[dict, float] | None:
+    """
+    Look up a cached response.
+
+    Returns:
+        The response and its age in seconds, or None if nothing is cached
+    """
+    cached = backend.get(cache_key)
+    if cached is None:
+        return None
+    entry = json.loads(cached)
+    return entry["data"], time.time() - entry["fetchedAt"]
+
+
+def make_api_request(endpoint: str, allow_stale: bool = True) -> dict:
     """
     Make an API request to the Clash Royale API.
+
+    Responses are cached for CR_CACHE_TTL_SECONDS, concurrent requests for the same endpoint
+    share a single upstream call, and upstream calls are rate limited per API key. If upstream
+    doesn't answer before the current deadline, an expired cached response is returned instead
+    when there is one. If the state backend can't be reached, a process-local one is used instead.
     
     Args:
         endpoint: The API endpoint to call
-        player_tag: Optional player tag that needs URL encoding
+        allow_stale: Whether an expired cached response may be returned at the deadline. Callers that
+            treat the response as current data should pass False, the deadline is then raised instead
         
     Returns:
         JSON response from the API
     """
-    url = f"{CR_API_BASE}/{endpoint}"
-    
-    logger.info(f"Making API request to: {url}")
-        
-    headers = {
-        "Authorization": f"Bearer {CR_API_KEY}"
-    }
+    try:
+        return _request(get_state_backend(), endpoint, allow_stale)
+    except StateBackendError as e:
+        logger.warning(f"{e}, requesting {endpoint} with process-local cache and rate limit")
+        metrics.increment("state_backend_errors")
+        return _request(_local_backend, endpoint, allow_stale)
 
-    response = requests.get(url, headers=headers)
 
-    if response.status_code == 200:
-        logger.info(f"API request successful. Response status: {response.status_code}")
-        return response.json()
-    else:
-        logger.error(f"API request failed. Status: {response.status_code}, Response: {response.text}")
-        raise Exception(f"Error fetching data: {response.status_code} - {response.text}")
+def _request(backend, endpoint: str, allow_stale: bool) -> dict:
+    cache_key = f"{_KEY_PREFIX}:cache:{endpoint}"
+    lock_key = f"{_KEY_PREFIX}:lock:{endpoint}"
+
+    cached = _get_cached(backend, cache_key)
+    if cached is not None and cached[1] < CR_CACHE_TTL_SECONDS:
+        logger.info(f"Serving {endpoint} from cache")
+        metrics.increment("cache_hits")
+        return cached[0]
+    stale = cached
+
+    try:
+        # Single flight: one caller fetches, the others wait for its result to land in the cache
+        give_up_at = time.monotonic() + SINGLE_FLIGHT_WAIT
+        token = backend.acquire_lock(lock_key, SINGLE_FLIGHT_LOCK_TTL)
+        while token is None:
+            time.sleep(0.05)
+            cached = _get_cached(backend, cache_key)
+            if cached is not None and cached[1] < CR_CACHE_TTL_SECONDS:
+                logger.info(f"Serving {endpoint} from cache after waiting on another request")
+                metrics.increment("cache_hits")
+                return cached[0]
+            deadline.check()
+            if time.monotonic() >= give_up_at:
+                logger.warning(f"Timed out waiting on another request for {endpoint}, fetching directly")
+                break
+            token = backend.acquire_lock(lock_key, SINGLE_FLIGHT_LOCK_TTL)
+
+        try:
+            result = _fetch(endpoint, backend)
+            if CR_CACHE_TTL_SECONDS + CR_STALE_TTL_SECONDS > 0:
+                entry = {"fetchedAt": time.time(), "data": result}
+                try:
+                    backend.set(cache_key, json.dumps(entry).encode(), CR_CACHE_TTL_SECONDS + CR_STALE_TTL_SECONDS)
+                except StateBackendError as e:
+                    logger.warning(f"Could not cache {endpoint}: {e}")
+            return result
+        finally:
+            if token is not None:
+                try:
+                    backend.release_lock(lock_key, token)
+                except StateBackendError as e:
+                    # The lock expires on its own after SINGLE_FLIGHT_LOCK_TTL
+                    logger.warning(f"Could not release lock for {endpoint}: {e}")
+    except (deadline.DeadlineExceeded, TimeoutError) as e:
+        if isinstance(e, deadline.DeadlineExceeded):
+            metrics.increment("deadline_exceeded")
+        if stale is None or not allow_stale:
+            raise
+        logger.warning(f"{e} Serving a cached response from {stale[1]:.0f}s ago instead")
+        metrics.increment("stale_served")
+        return stale[0]
 
 
 def encode_tag(player_tag: str) -> str:
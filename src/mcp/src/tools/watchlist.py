@@ -0,0 +1,386 @@
+import os
+import time
+import logging
+import threading
+from .utils import make_api_request, encode_tag
+from .deadline import with_deadline
+from .results import guard_result_size
+
+logger = logging.getLogger(__name__)
+
+# Upstream requests per second the poller may spend, kept well under CR_RATE_LIMIT_PER_SECOND so
+# user-driven tool calls still have headroom. Each poll of a player costs two requests.
+CR_WATCHLIST_REQUESTS_PER_SECOND = float(os.getenv("CR_WATCHLIST_REQUESTS_PER_SECOND", "1"))
+CR_WATCHLIST_MIN_POLL_INTERVAL = float(os.getenv("CR_WATCHLIST_MIN_POLL_INTERVAL", "60"))
+CR_WATCHLIST_MAX_PLAYERS = int(os.getenv("CR_WATCHLIST_MAX_PLAYERS", "50"))
+CR_WATCHLIST_MAX_BATTLES = int(os.getenv("CR_WATCHLIST_MAX_BATTLES", "1000"))
+
+REQUESTS_PER_POLL = 2
+# Minimum seconds between two polls, so polls are spread out instead of sent back to back
+POLL_SPACING = REQUESTS_PER_POLL / CR_WATCHLIST_REQUESTS_PER_SECOND
+# Watched data older than this many poll intervals isn't served in place of the API (polls keep failing)
+FRESHNESS_INTERVALS = 2
+# Player info fields compared between polls to detect changes
+TRACKED_FIELDS = ("name", "expLevel", "trophies", "bestTrophies", "wins", "losses", "battleCount", "threeCrownWins")
+MAX_CHANGES = 200
+
+
+def normalize_tag(player_tag: str) -> str:
+    """
+    Normalize a player tag to the uppercase, '#'-prefixed form the API returns.
+
+    Args:
+        player_tag: The player tag, with or without the leading '#'
+
+    Returns:
+        The normalized player tag
+    """
+    player_tag = player_tag.strip().upper()
+    return player_tag if player_tag.startswith("#") else f"#{player_tag}"
+
+
+class WatchedPlayer:
+    """
+    Local state for one watched player: the latest player info and the accumulated battle history.
+    """
+
+    def __init__(self, tag: str):
+        self.tag = tag
+        self.info = None
+        # Newest first, deduplicated on battleTime
+        self.battles = []
+        self.battle_times = set()
+        self.changes = []
+        # Length of the API's battle log on the last poll, the window get_player_battle_log answers with
+        self.log_window = 0
+        self.polls = 0
+        self.last_polled = None
+        self.polled_at = None
+        self.last_error = None
+        self.next_poll_at = 0.0
+
+    def merge_battles(self, battle_log: list) -> int:
+        """
+        Add battles from a fresh battle log that haven't been seen on earlier polls.
+
+        Args:
+            battle_log: The battle log as returned by the API
+
+        Returns:
+            The number of new battles
+        """
+        new_battles = [battle for battle in battle_log if battle.get("battleTime") not in self.battle_times]
+        if new_battles:
+            # battleTime is formatted like 20240101T120000.000Z, so it sorts chronologically as a string
+            battles = sorted(new_battles + self.battles, key=lambda battle: battle.get("battleTime", ""), reverse=True)
+            self.battles = battles[:CR_WATCHLIST_MAX_BATTLES]
+            self.battle_times = {battle.get("battleTime") for battle in self.battles}
+        self.log_window = len(battle_log)
+        return len(new_battles)
+
+    def update_info(self, info: dict) -> None:
+        """
+        Replace the player info, recording which tracked fields changed since the last poll.
+
+        Args:
+            info: The player info as returned by the API
+        """
+        if self.info is not None:
+            for field in TRACKED_FIELDS:
+                old, new = self.info.get(field), info.get(field)
+                if old != new:
+                    self.changes.append({"polledAt": self.last_polled, "field": field, "old": old, "new": new})
+
+            old_clan, new_clan = self.info.get("clan", {}).get("tag"), info.get("clan", {}).get("tag")
+            if old_clan != new_clan:
+                self.changes.append({"polledAt": self.last_polled, "field": "clan", "old": old_clan, "new": new_clan})
+
+            del self.changes[:-MAX_CHANGES]
+        self.info = info
+
+    def summary(self) -> dict:
+        return {
+            "tag": self.tag,
+            "name": self.info.get("name") if self.info else None,
+            "storedBattles": len(self.battles),
+            "polls": self.polls,
+            "lastPolled": self.last_polled,
+            "lastError": self.last_error,
+        }
+
+
+class Watchlist:
+    """
+    Set of watched players, polled in the background and spread across the watchlist request budget.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._players = {}
+        self._wake = threading.Event()
+        self._thread = None
+        self._last_poll_at = float("-inf")
+
+    def poll_interval(self) -> float:
+        """
+        Seconds between polls of the same player, stretched as players are added so the
+        poller never exceeds CR_WATCHLIST_REQUESTS_PER_SECOND.
+        """
+        with self._lock:
+            return self._poll_interval()
+
+    def _poll_interval(self) -> float:
+        return max(CR_WATCHLIST_MIN_POLL_INTERVAL, len(self._players) * POLL_SPACING)
+
+    def add(self, player_tag: str) -> WatchedPlayer:
+        """
+        Watch a player. The first poll happens right away, so tags that don't exist (or can't be fetched
+        right now) are rejected instead of costing a poll every interval.
+
+        Args:
+            player_tag: The player tag, with or without the leading '#'
+
+        Returns:
+            The watched player
+        """
+        tag = normalize_tag(player_tag)
+        with self._lock:
+            if tag in self._players:
+                return self._players[tag]
+            if len(self._players) >= CR_WATCHLIST_MAX_PLAYERS:
+                raise ValueError(f"The watchlist is full ({CR_WATCHLIST_MAX_PLAYERS} players), unwatch a player first.")
+
+        player = WatchedPlayer(tag)
+        try:
+            self.poll(player)
+        except Exception as e:
+            raise ValueError(f"Could not watch {tag}, the player could not be fetched: {e}") from e
+
+        with self._lock:
+            if tag in self._players:
+                return self._players[tag]
+            if len(self._players) >= CR_WATCHLIST_MAX_PLAYERS:
+                raise ValueError(f"The watchlist is full ({CR_WATCHLIST_MAX_PLAYERS} players), unwatch a player first.")
+            self._players[tag] = player
+            # Next poll goes into the first free slot after a full interval, behind the polls already scheduled
+            scheduled = [other.next_poll_at for other in self._players.values() if other is not player]
+            player.next_poll_at = max([time.monotonic() + self._poll_interval()] + [at + POLL_SPACING for at in scheduled])
+
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watchlist-poller", daemon=True)
+                self._thread.start()
+
+        self._wake.set()
+        return player
+
+    def remove(self, player_tag: str) -> bool:
+        with self._lock:
+            return self._players.pop(normalize_tag(player_tag), None) is not None
+
+    def get(self, player_tag: str) -> WatchedPlayer | None:
+        """
+        Get a watched player that has been polled at least once.
+
+        Args:
+            player_tag: The player tag, with or without the leading '#'
+
+        Returns:
+            The watched player, or None if the tag isn't watched or hasn't been polled yet
+        """
+        player = self._players.get(normalize_tag(player_tag))
+        if player is None or player.info is None:
+            return None
+        return player
+
+    def get_fresh(self, player_tag: str) -> WatchedPlayer | None:
+        """
+        Get a watched player whose last successful poll is recent enough to answer lookups in place of
+        the API, within FRESHNESS_INTERVALS poll intervals.
+
+        Args:
+            player_tag: The player tag, with or without the leading '#'
+
+        Returns:
+            The watched player, or None if the tag isn't watched or its data is stale
+        """
+        player = self.get(player_tag)
+        if player is None:
+            return None
+        age = time.monotonic() - player.polled_at
+        if age > FRESHNESS_INTERVALS * self.poll_interval():
+            logger.warning(f"Watchlist data for {player.tag} is {age:.0f}s old (last error: {player.last_error}), not serving it")
+            return None
+        return player
+
+    def players(self) -> list[WatchedPlayer]:
+        with self._lock:
+            return list(self._players.values())
+
+    def poll(self, player: WatchedPlayer) -> None:
+        """
+        Fetch a player's info and battle log and merge them into local state. Errors are recorded
+        on the player and raised.
+
+        Args:
+            player: The watched player to poll
+        """
+        encoded_tag = encode_tag(player.tag)
+        with self._lock:
+            self._last_poll_at = time.monotonic()
+        try:
+            # A stale response would be stored as this poll's data, so a slow upstream fails the poll instead
+            info = make_api_request(f"players/{encoded_tag}", allow_stale=False)
+            battle_log = make_api_request(f"players/{encoded_tag}/battlelog", allow_stale=False)
+        except Exception as e:
+            logger.error(f"Watchlist poll failed for {player.tag}: {e}")
+            with self._lock:
+                player.last_error = str(e)
+            raise
+
+        with self._lock:
+            player.last_polled = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())
+            player.polled_at = time.monotonic()
+            player.update_info(info)
+            new_battles = player.merge_battles(battle_log)
+            player.polls += 1
+            player.last_error = None
+        logger.info(f"Watchlist polled {player.tag}: {new_battles} new battles, {len(player.battles)} stored")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                due = min(self._players.values(), key=lambda player: player.next_poll_at, default=None)
+
+            if due is None:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            # Polls are spaced out even when several are due, so the poller stays within its request budget
+            now = time.monotonic()
+            delay = max(due.next_poll_at, self._last_poll_at + POLL_SPACING) - now
+            if delay > 0:
+                # Woken early when the watchlist changes, a newly added player may be due sooner
+                if self._wake.wait(delay):
+                    self._wake.clear()
+                continue
+
+            # Next poll is scheduled before polling so a slow or failing poll doesn't reschedule the whole list
+            due.next_poll_at = now + self.poll_interval()
+            try:
+                self.poll(due)
+            except Exception:
+                # Already logged and recorded on the player, it is retried on its next turn
+                pass
+
+
+_watchlist = Watchlist()
+
+
+def get_watchlist() -> Watchlist:
+    """
+    Get the process-wide watchlist.
+
+    Returns:
+        The watchlist
+    """
+    return _watchlist
+
+
+def register_watchlist_tools(mcp):
+    """
+    Register all watchlist-related tools with the MCP server.
+
+    Args:
+        mcp: The FastMCP server instance
+
+    Returns:
+        The registered tool functions
+    """
+
+    @mcp.tool()
+    @with_deadline()
+    def watch_player(player_tag: str) -> dict:
+        """
+        Add a player to the watchlist. Watched players are polled in the background, so later lookups of the player's
+        info and battle log are answered instantly, and their battle history keeps growing past the ~25 battles the
+        Clash Royale API returns. Use this when the user asks to follow or track a player, or keeps asking about the same player.
+
+        Args:
+            player_tag: The player tag to watch (e.g. #ABCDEF). This should either be provided by the user in the
+            format of a string with a leading '#', or retrieved as a part of a reponse from a different tool.
+
+        Returns:
+            The watched player's tag and the current poll interval in seconds. Fails if the player doesn't exist.
+        """
+        logger.info(f"watch_player called with player_tag: {player_tag}")
+
+        watchlist = get_watchlist()
+        player = watchlist.add(player_tag)
+        return {"tag": player.tag, "pollIntervalSeconds": watchlist.poll_interval()}
+
+    @mcp.tool()
+    def unwatch_player(player_tag: str) -> dict:
+        """
+        Remove a player from the watchlist, discarding their stored battle history.
+
+        Args:
+            player_tag: The player tag to stop watching (e.g. #ABCDEF)
+
+        Returns:
+            Whether the player was on the watchlist.
+        """
+        logger.info(f"unwatch_player called with player_tag: {player_tag}")
+
+        return {"tag": normalize_tag(player_tag), "removed": get_watchlist().remove(player_tag)}
+
+    @mcp.tool()
+    def list_watched_players() -> dict:
+        """
+        List the players on the watchlist.
+
+        Returns:
+            Each watched player's tag, name, number of stored battles and when they were last polled.
+        """
+        logger.info("list_watched_players called")
+
+        watchlist = get_watchlist()
+        return {
+            "pollIntervalSeconds": watchlist.poll_interval(),
+            "players": [player.summary() for player in watchlist.players()],
+        }
+
+    @mcp.tool()
+    @guard_result_size()
+    def get_watched_player_history(
+        player_tag: str,
+        limit: int = None,
+        ) -> dict:
+        """
+        Get the accumulated battle history and detected stat changes (trophies, wins, clan, etc.) of a watched player.
+        Unlike get_player_battle_log this can return more than the latest ~25 battles. The player must be added with
+        the watch_player tool first.
+
+        Args:
+            player_tag: The watched player's tag (e.g. #ABCDEF)
+
+            limit: Limit the number of battles returned, newest first. (optional)
+
+        Returns:
+            The player's stored battles, newest first, and the changes detected between polls.
+        """
+        logger.info(f"get_watched_player_history called with player_tag={player_tag}, limit={limit}")
+
+        player = get_watchlist().get(player_tag)
+        if player is None:
+            raise ValueError(f"{normalize_tag(player_tag)} is not watched or hasn't been polled yet, use watch_player first.")
+
+        battles = player.battles[:limit] if limit else player.battles
+        return {**player.summary(), "battles": battles, "changes": list(player.changes)}
+
+    return [
+        watch_player,
+        unwatch_player,
+        list_watched_players,
+        get_watched_player_history,
+    ]
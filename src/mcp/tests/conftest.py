@@ -0,0 +1,190 @@
+import os
+import socket
+import socketserver
+import threading
+import time
+
+import pytest
+
+# utils.py requires a key at import, values set here take precedence over a .env file
+os.environ.setdefault("CR_API_KEY", "test-key")
+os.environ.setdefault("CR_API_MODE", "live")
+
+from tools import utils
+from tools.state import MemoryStateBackend, RedisStateBackend, set_state_backend
+
+
+class RespStandIn:
+    """
+    Minimal in-process server speaking the Redis protocol, implementing only the commands
+    RedisStateBackend uses: GET, SET (PX, NX), DEL, WATCH/UNWATCH, MULTI/EXEC, TIME, AUTH and SELECT.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        # Bumped on every write, WATCH compares these at EXEC
+        self._versions = {}
+        self._connections = set()
+
+        stand_in = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                stand_in._serve(self.connection, self.rfile)
+
+        self._server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"redis://{host}:{port}/0"
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.drop_connections()
+
+    def drop_connections(self):
+        """Close every client connection, as a server restart would."""
+        with self._lock:
+            connections, self._connections = self._connections, set()
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _serve(self, connection, reader):
+        with self._lock:
+            self._connections.add(connection)
+        watched, queued = {}, None
+        while True:
+            try:
+                command = self._read_command(reader)
+            except (ConnectionError, OSError, ValueError):
+                return
+            if command is None:
+                return
+
+            name = command[0].upper()
+            if name == "MULTI":
+                queued = []
+                reply = b"+OK\r\n"
+            elif name == "EXEC":
+                with self._lock:
+                    if any(self._versions.get(key, 0) != version for key, version in watched.items()):
+                        reply = b"*-1\r\n"
+                    else:
+                        reply = f"*{len(queued)}\r\n".encode() + b"".join(self._run(queued_command) for queued_command in queued)
+                watched, queued = {}, None
+            elif queued is not None:
+                queued.append(command)
+                reply = b"+QUEUED\r\n"
+            elif name == "WATCH":
+                with self._lock:
+                    for key in command[1:]:
+                        watched[key] = self._versions.get(key, 0)
+                reply = b"+OK\r\n"
+            elif name == "UNWATCH":
+                watched = {}
+                reply = b"+OK\r\n"
+            else:
+                with self._lock:
+                    reply = self._run(command)
+
+            try:
+                connection.sendall(reply)
+            except OSError:
+                return
+
+    @staticmethod
+    def _read_command(reader) -> list | None:
+        line = reader.readline()
+        if not line:
+            return None
+        arguments = []
+        for _ in range(int(line[1:])):
+            length = int(reader.readline()[1:])
+            arguments.append(reader.read(length + 2)[:-2])
+        return [arguments[0].decode()] + arguments[1:]
+
+    def _live(self, key):
+        entry = self._values.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            del self._values[key]
+            return None
+        return entry
+
+    def _run(self, command) -> bytes:
+        name, arguments = command[0].upper(), command[1:]
+        if name in ("AUTH", "SELECT", "PING"):
+            return b"+OK\r\n"
+        if name == "TIME":
+            now = time.time()
+            seconds, microseconds = str(int(now)).encode(), str(int(now % 1 * 1_000_000)).encode()
+            return b"*2\r\n" + b"".join(b"$%d\r\n%s\r\n" % (len(part), part) for part in (seconds, microseconds))
+        if name == "GET":
+            entry = self._live(arguments[0])
+            return b"$-1\r\n" if entry is None else b"$%d\r\n%s\r\n" % (len(entry[0]), entry[0])
+        if name == "SET":
+            key, value, options = arguments[0], arguments[1], [option.upper() for option in arguments[2:]]
+            if b"NX" in options and self._live(key) is not None:
+                return b"$-1\r\n"
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(options[options.index(b"PX") + 1]) / 1000
+            self._values[key] = (value, expires_at)
+            self._versions[key] = self._versions.get(key, 0) + 1
+            return b"+OK\r\n"
+        if name == "DEL":
+            deleted = 0
+            for key in arguments:
+                if self._live(key) is not None:
+                    del self._values[key]
+                    deleted += 1
+                self._versions[key] = self._versions.get(key, 0) + 1
+            return b":%d\r\n" % deleted
+        return f"-ERR unknown command '{name}'\r\n".encode()
+
+
+@pytest.fixture
+def resp_server():
+    server = RespStandIn()
+    yield server
+    server.close()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        yield MemoryStateBackend()
+    else:
+        yield RedisStateBackend(request.getfixturevalue("resp_server").url)
+
+
+@pytest.fixture
+def api(backend, monkeypatch):
+    """
+    make_api_request on the given backend with upstream replaced by a stub. Set `api.respond` to
+    change what upstream answers, `api.calls` lists the endpoints sent upstream.
+    """
+    class Upstream:
+        def __init__(self):
+            self.calls = []
+            self._calls_lock = threading.Lock()
+            self.respond = lambda endpoint: {"endpoint": endpoint}
+
+        def send(self, endpoint, timeout):
+            with self._calls_lock:
+                self.calls.append(endpoint)
+            return self.respond(endpoint)
+
+    upstream = Upstream()
+    set_state_backend(backend)
+    monkeypatch.setattr(utils, "_send", upstream.send)
+    monkeypatch.setattr(utils, "_local_backend", MemoryStateBackend())
+    yield upstream
+    set_state_backend(None)
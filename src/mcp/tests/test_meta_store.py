@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+from tools import meta_store
+from tools.meta_store import MetaStore, _merge_counts
+
+
+def _deck(first_id: int) -> list[dict]:
+    return [{"id": card_id, "name": f"Card {card_id}"} for card_id in range(first_id, first_id + 8)]
+
+
+def _battle(battle_time: str, winner: str = "#A", loser: str = "#B", winner_deck: int = 1, loser_deck: int = 11) -> dict:
+    return {
+        "type": "pathOfLegend",
+        "battleTime": battle_time,
+        "team": [{"tag": winner, "crowns": 3, "cards": _deck(winner_deck)}],
+        "opponent": [{"tag": loser, "crowns": 1, "cards": _deck(loser_deck)}],
+    }
+
+
+def _mirrored(battle: dict) -> dict:
+    """The same battle as it appears in the opponent's battle log."""
+    return {**battle, "team": battle["opponent"], "opponent": battle["team"]}
+
+
+def test_battle_from_both_battle_logs_is_counted_once(tmp_path):
+    store = MetaStore(str(tmp_path / "meta.npz"))
+    battle = _battle("20260101T000000.000Z")
+
+    assert store.add_battles([battle, _mirrored(battle)]) == 1
+    assert store.add_battles([_mirrored(battle)]) == 0
+    assert store.total_decks == 2
+    assert store.deck_uses.tolist() == [1, 1]
+    assert sorted(store.deck_wins.tolist()) == [0, 1]
+
+
+def test_card_stats(tmp_path):
+    store = MetaStore(str(tmp_path / "meta.npz"))
+    store.add_battles([_battle("20260101T000000.000Z"), _battle("20260101T000100.000Z", winner_deck=5)])
+
+    stats = {card["name"]: card for card in store.card_stats(limit=100)}
+    # Card 5 is in both winning decks, card 1 only in the first
+    assert stats["Card 5"] == {"name": "Card 5", "id": 5, "usageRate": 0.5, "winRate": 1.0, "uses": 2, "wins": 2}
+    assert stats["Card 1"]["uses"] == 1
+    assert stats["Card 18"]["winRate"] == 0.0
+
+
+def test_merge_counts_grows_the_key_table():
+    keys, (counts,), old_positions = _merge_counts(
+        np.array([2, 5], dtype=np.uint64), [np.array([10, 20])],
+        np.array([1, 5, 7], dtype=np.uint64), [np.array([1, 2, 3])],
+    )
+
+    assert keys.tolist() == [1, 2, 5, 7]
+    assert counts.tolist() == [1, 10, 22, 3]
+    assert old_positions.tolist() == [1, 2]
+
+
+def test_oldest_seen_battles_are_forgotten(tmp_path, monkeypatch):
+    monkeypatch.setattr(meta_store, "CR_META_MAX_SEEN_BATTLES", 3)
+    store = MetaStore(str(tmp_path / "meta.npz"))
+    battles = [_battle(f"20260101T00000{second}.000Z") for second in range(5)]
+
+    assert store.add_battles(battles[:2]) == 2
+    assert store.add_battles(battles[2:]) == 3
+
+    assert len(store.seen_battles) == 3
+    assert np.all(store.seen_battles[1:] > store.seen_battles[:-1])
+    # The two oldest were forgotten and count as new again, the newest are still known
+    assert store.add_battles(battles[4:]) == 0
+    assert store.add_battles(battles[:1]) == 1
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "meta.npz")
+    store = MetaStore(path)
+    battle = _battle("20260101T000000.000Z")
+    store.add_battles([battle])
+    store.save()
+
+    queried = MetaStore.load(path)
+    assert queried.seen_battles is None
+    assert queried.card_stats(limit=100) == store.card_stats(limit=100)
+    assert queried.deck_stats(min_uses=1) == store.deck_stats(min_uses=1)
+    with pytest.raises(ValueError, match="seen_battles=True"):
+        queried.add_battles([battle])
+
+    sampler = MetaStore.load(path, seen_battles=True)
+    assert sampler.add_battles([_mirrored(battle)]) == 0
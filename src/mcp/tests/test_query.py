@@ -0,0 +1,118 @@
+import asyncio
+import time
+
+import pytest
+from mcp.server.fastmcp import FastMCP
+
+from tools.query import _resolve_path, _shape, register_query_tools
+
+MEMBERS = [
+    {"tag": "#A", "name": "Ann", "trophies": 5000, "role": "member"},
+    {"tag": "#B", "name": "Bob", "trophies": 6000, "role": "leader"},
+    {"tag": "#C", "name": "Cid", "trophies": 5500, "role": "member"},
+    {"tag": "#D", "name": "Dee", "role": "member"},
+]
+
+
+@pytest.fixture
+def planner():
+    """
+    run_query over stub tools. `planner.calls` lists the tool calls made, in order.
+    """
+    calls = []
+
+    def search_clans(name: str, limit: int = None) -> dict:
+        calls.append(("search_clans", name))
+        return {"items": [{"tag": "#CLAN", "name": name}]}
+
+    def get_clan_members(clan_tag: str) -> dict:
+        calls.append(("get_clan_members", clan_tag))
+        return {"items": MEMBERS}
+
+    def get_player_info(player_tag: str) -> dict:
+        calls.append(("get_player_info", player_tag))
+        return {"tag": player_tag, "bestTrophies": 7000}
+
+    def wait(seconds: float) -> dict:
+        calls.append(("wait", seconds))
+        time.sleep(seconds)
+        return {"waited": seconds}
+
+    def watch_player(player_tag: str) -> dict:
+        return {}
+
+    [run_query] = register_query_tools(FastMCP("test"), [search_clans, get_clan_members, get_player_info, wait, watch_player])
+
+    def run(steps, output=None):
+        return asyncio.run(run_query(steps, output))
+
+    run.calls = calls
+    return run
+
+
+def test_resolve_path_maps_keys_over_lists():
+    value = {"items": MEMBERS}
+
+    assert _resolve_path(value, "items.tag") == ["#A", "#B", "#C", "#D"]
+    assert _resolve_path(value, "items[-1].name") == "Dee"
+    assert _resolve_path(value, "items[9].name") is None
+
+
+def test_shape_filters_sorts_and_limits():
+    step = {"filter": [{"field": "role", "value": "member"}], "sort": "-trophies", "limit": 2, "fields": ["tag"]}
+
+    assert _shape(step, MEMBERS) == [{"tag": "#C"}, {"tag": "#A"}]
+
+
+def test_shape_sorts_missing_values_last():
+    assert [member["tag"] for member in _shape({"sort": "trophies"}, MEMBERS)] == ["#A", "#C", "#B", "#D"]
+
+
+@pytest.mark.parametrize("steps, error", [
+    ([], "no steps"),
+    ([{"id": "a", "tool": "watch_player", "args": {"player_tag": "#A"}}], "not a tool a plan can call"),
+    ([{"id": "a", "tool": "search_clans", "args": {"clan": "x"}}], "no argument"),
+    ([{"id": "a", "tool": "search_clans", "args": {"name": "$b.items"}},
+      {"id": "b", "tool": "search_clans", "args": {"name": "x"}}], "only earlier steps"),
+    ([{"id": "a", "tool": "search_clans", "args": {"name": "x"}},
+      {"id": "a", "tool": "search_clans", "args": {"name": "y"}}], "more than once"),
+    ([{"id": "a", "tool": "get_player_info", "args": {"player_tag": "$item.tag"}}], "no foreach"),
+    ([{"id": "a", "tool": "get_clan_members", "args": {"clan_tag": "#CLAN"}, "filter": [{"field": "role", "op": "~"}]}], "unknown filter op"),
+])
+def test_invalid_plans_are_rejected(planner, steps, error):
+    with pytest.raises(ValueError, match=error):
+        planner(steps)
+    assert planner.calls == []
+
+
+def test_chained_plan(planner):
+    result = planner([
+        {"id": "clans", "tool": "search_clans", "args": {"name": "Vanguard", "limit": 1}},
+        {"id": "members", "tool": "get_clan_members", "args": {"clan_tag": "$clans.items[0].tag"},
+         "select": "items", "sort": "-trophies", "limit": 2, "fields": ["tag"]},
+        {"id": "players", "tool": "get_player_info", "foreach": "$members", "args": {"player_tag": "$item.tag"}},
+    ])
+
+    assert result == {"output": "players", "result": [{"tag": "#B", "bestTrophies": 7000}, {"tag": "#C", "bestTrophies": 7000}]}
+
+
+def test_repeated_calls_are_made_once(planner):
+    planner([
+        {"id": "members", "tool": "get_clan_members", "args": {"clan_tag": "#CLAN"}, "select": "items"},
+        {"id": "first", "tool": "get_player_info", "args": {"player_tag": "#A"}},
+        {"id": "second", "tool": "get_player_info", "args": {"player_tag": "#A"}},
+        # The same player for every member
+        {"id": "each", "tool": "get_player_info", "foreach": "$members", "args": {"player_tag": "$first.tag"}},
+    ], output="second")
+
+    assert sorted(planner.calls) == [("get_clan_members", "#CLAN"), ("get_player_info", "#A")]
+
+
+def test_independent_steps_run_in_parallel(planner):
+    start = time.monotonic()
+    planner([
+        {"id": "first", "tool": "wait", "args": {"seconds": 0.3}},
+        {"id": "second", "tool": "wait", "args": {"seconds": 0.31}},
+    ])
+
+    assert time.monotonic() - start < 0.5
@@ -0,0 +1,51 @@
+import pytest
+from mcp.server.fastmcp import FastMCP
+
+from tools import utils
+from tools.results import guard_result_size, register_result_tools
+from tools.state import MemoryStateBackend, RedisStateBackend, set_state_backend
+
+
+@pytest.fixture
+def fetch_result_slice(monkeypatch):
+    monkeypatch.setattr(utils, "_local_backend", MemoryStateBackend())
+    set_state_backend(MemoryStateBackend())
+    [fetch] = register_result_tools(FastMCP("test"))
+    yield fetch
+    set_state_backend(None)
+
+
+def _members(count: int) -> dict:
+    return {"items": [{"tag": f"#{number}", "trophies": number} for number in range(count)]}
+
+
+def test_oversized_result_is_stored_under_a_handle(fetch_result_slice):
+    result = guard_result_size(500)(_members)(100)
+
+    assert result["truncated"] is True
+    assert result["summary"]["items"]["count"] == 100
+    page = fetch_result_slice(result["handle"], offset=10, limit=5, fields=["tag"])
+    assert page == {"total": 100, "offset": 10, "items": [{"tag": f"#{number}"} for number in range(10, 15)], "nextOffset": 15}
+
+
+def test_unreachable_backend_stores_handles_locally(fetch_result_slice):
+    set_state_backend(RedisStateBackend("redis://127.0.0.1:1/0", timeout=0.5))
+
+    result = guard_result_size(500)(_members)(100)
+
+    assert fetch_result_slice(result["handle"])["total"] == 100
+
+
+def test_note_names_the_list_path_when_there_is_no_items_list(fetch_result_slice):
+    # Shaped like a run_query result
+    result = guard_result_size(500)(lambda: {"output": "members", "result": _members(100)["items"]})()
+
+    assert 'path="result"' in result["note"]
+    assert fetch_result_slice(result["handle"], path="result")["total"] == 100
+
+
+def test_negative_offset_is_rejected(fetch_result_slice):
+    result = guard_result_size(500)(_members)(100)
+
+    with pytest.raises(ValueError, match="offset"):
+        fetch_result_slice(result["handle"], offset=-2)
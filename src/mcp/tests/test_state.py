@@ -0,0 +1,122 @@
+import socket
+import time
+
+import pytest
+
+from tools.state import MemoryStateBackend, RedisStateBackend, StateBackendError
+
+
+def test_set_get_delete(backend):
+    assert backend.get("key") is None
+    backend.set("key", b"value", 10)
+    assert backend.get("key") == b"value"
+    backend.delete("key")
+    assert backend.get("key") is None
+
+
+def test_values_expire(backend):
+    backend.set("key", b"value", 0.05)
+    time.sleep(0.1)
+    assert backend.get("key") is None
+
+
+def test_lock_is_exclusive(backend):
+    token = backend.acquire_lock("lock", 10)
+    assert token is not None
+    assert backend.acquire_lock("lock", 10) is None
+
+
+def test_lock_release_requires_owner_token(backend):
+    token = backend.acquire_lock("lock", 10)
+
+    backend.release_lock("lock", "not-the-owner")
+    assert backend.acquire_lock("lock", 10) is None
+
+    backend.release_lock("lock", token)
+    assert backend.acquire_lock("lock", 10) is not None
+
+
+def test_release_after_expiry_keeps_new_owner(backend):
+    stale_token = backend.acquire_lock("lock", 0.05)
+    time.sleep(0.1)
+    new_token = backend.acquire_lock("lock", 10)
+    assert new_token is not None
+
+    backend.release_lock("lock", stale_token)
+    assert backend.acquire_lock("lock", 10) is None
+
+
+def test_bucket_allows_burst_then_spaces_tokens(backend):
+    waits = [backend.take_token("bucket", 10, 3) for _ in range(5)]
+
+    assert waits[:3] == [0, 0, 0]
+    assert waits[3] == pytest.approx(0.1, abs=0.03)
+    assert waits[4] == pytest.approx(0.2, abs=0.03)
+
+
+def test_bucket_max_wait_does_not_reserve(backend):
+    backend.take_token("bucket", 10, 1)
+
+    assert backend.take_token("bucket", 10, 1, max_wait=0) is None
+    assert backend.take_token("bucket", 10, 1, max_wait=0) is None
+    # Declined reservations didn't push the next token back
+    assert backend.take_token("bucket", 10, 1) == pytest.approx(0.1, abs=0.03)
+
+
+def test_bucket_is_shared_between_instances(resp_server):
+    first = RedisStateBackend(resp_server.url)
+    second = RedisStateBackend(resp_server.url)
+
+    assert first.take_token("bucket", 10, 2) == 0
+    assert second.take_token("bucket", 10, 2) == 0
+    assert first.take_token("bucket", 10, 2) == pytest.approx(0.1, abs=0.03)
+    assert second.take_token("bucket", 10, 2) == pytest.approx(0.2, abs=0.03)
+
+
+def test_lock_is_shared_between_instances(resp_server):
+    first = RedisStateBackend(resp_server.url)
+    second = RedisStateBackend(resp_server.url)
+
+    token = first.acquire_lock("lock", 10)
+    assert second.acquire_lock("lock", 10) is None
+    first.release_lock("lock", token)
+    assert second.acquire_lock("lock", 10) is not None
+
+
+def test_reconnects_after_connection_loss(resp_server):
+    backend = RedisStateBackend(resp_server.url)
+    backend.set("key", b"value", 10)
+
+    resp_server.drop_connections()
+    assert backend.get("key") == b"value"
+
+
+def _closed_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_unreachable_backend_fails_fast(monkeypatch):
+    backend = RedisStateBackend(f"redis://127.0.0.1:{_closed_port()}/0", timeout=0.5)
+
+    with pytest.raises(StateBackendError):
+        backend.get("key")
+
+    attempts = []
+    monkeypatch.setattr(backend, "_connect", lambda: attempts.append(1))
+    with pytest.raises(StateBackendError):
+        backend.get("key")
+    # Within the backoff the server isn't tried again
+    assert attempts == []
+
+
+def test_memory_backend_drops_expired_keys_that_are_never_read():
+    backend = MemoryStateBackend()
+    for number in range(100):
+        backend.set(f"result:{number}", b"value", 0.05)
+    time.sleep(0.1)
+
+    backend.set("key", b"value", 10)
+
+    assert list(backend._values) == ["key"]
@@ -0,0 +1,124 @@
+import threading
+import time
+
+import pytest
+
+from tools import deadline, utils
+from tools.state import RedisStateBackend, set_state_backend
+
+
+def test_repeated_requests_are_served_from_cache(api):
+    first = utils.make_api_request("cards")
+    second = utils.make_api_request("cards")
+
+    assert first == second == {"endpoint": "cards"}
+    assert api.calls == ["cards"]
+
+
+def test_expired_responses_are_fetched_again(api, monkeypatch):
+    monkeypatch.setattr(utils, "CR_CACHE_TTL_SECONDS", 0)
+
+    utils.make_api_request("cards")
+    utils.make_api_request("cards")
+
+    assert api.calls == ["cards", "cards"]
+
+
+def test_errors_are_not_cached(api):
+    def fail(endpoint):
+        raise Exception("Error fetching data: 503 - unavailable")
+
+    api.respond = fail
+    with pytest.raises(Exception, match="503"):
+        utils.make_api_request("cards")
+
+    api.respond = lambda endpoint: {"endpoint": endpoint}
+    assert utils.make_api_request("cards") == {"endpoint": "cards"}
+    assert api.calls == ["cards", "cards"]
+
+
+def test_concurrent_requests_share_one_upstream_call(api):
+    def slow(endpoint):
+        time.sleep(0.2)
+        return {"endpoint": endpoint}
+
+    api.respond = slow
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(utils.make_api_request("cards"))) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [{"endpoint": "cards"}] * 8
+    assert api.calls == ["cards"]
+
+
+def test_single_flight_across_instances(resp_server, api, monkeypatch):
+    # Each thread gets its own connection, as separate replicas would
+    backends = threading.local()
+    monkeypatch.setattr(utils, "get_state_backend", lambda: backends.__dict__.setdefault("backend", RedisStateBackend(resp_server.url)))
+
+    def slow(endpoint):
+        time.sleep(0.2)
+        return {"endpoint": endpoint}
+
+    api.respond = slow
+    threads = [threading.Thread(target=utils.make_api_request, args=("cards",)) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert api.calls == ["cards"]
+
+
+def test_stale_response_served_at_deadline(api, monkeypatch):
+    utils.make_api_request("cards")
+    monkeypatch.setattr(utils, "CR_CACHE_TTL_SECONDS", 0)
+
+    def hang(endpoint):
+        time.sleep(0.5)
+        return {"endpoint": endpoint, "fresh": True}
+
+    api.respond = hang
+    result = deadline.with_deadline(0.1)(utils.make_api_request)("cards")
+
+    assert result == {"endpoint": "cards"}
+
+
+def test_unreachable_backend_falls_back_to_local_state(api):
+    set_state_backend(RedisStateBackend("redis://127.0.0.1:1/0", timeout=0.5))
+
+    assert utils.make_api_request("cards") == {"endpoint": "cards"}
+    assert utils.make_api_request("cards") == {"endpoint": "cards"}
+    assert api.calls == ["cards"]
+
+
+def test_stale_response_not_served_when_disallowed(api, monkeypatch):
+    utils.make_api_request("cards")
+    monkeypatch.setattr(utils, "CR_CACHE_TTL_SECONDS", 0)
+
+    def hang(endpoint):
+        time.sleep(0.5)
+        return {"endpoint": endpoint, "fresh": True}
+
+    api.respond = hang
+    with pytest.raises(deadline.DeadlineExceeded):
+        deadline.with_deadline(0.1)(utils.make_api_request)("cards", allow_stale=False)
+
+
+def test_recording_errors_do_not_fail_requests(monkeypatch):
+    class Response:
+        status_code, text = 200, '{"endpoint": "cards"}'
+
+    class UnwritableRecorder:
+        path = "/unwritable/api_archive.jsonl.gz"
+
+        def record(self, endpoint, status, body, elapsed):
+            raise PermissionError(13, "Permission denied")
+
+    monkeypatch.setattr("requests.get", lambda url, headers, timeout: Response())
+    monkeypatch.setattr(utils, "_recorder", UnwritableRecorder())
+
+    assert utils._send("cards", 1) == {"endpoint": "cards"}